@@ -5,31 +5,59 @@ Bilibili视频字幕下载与总结 - Web服务
 """
 
 import os
+import re
 import sys
 import json
 import uuid
+import base64
+import gzip
 import time
 import threading
 import shutil
+import copy
 import urllib.error
 import urllib.request
 from pathlib import Path
 from datetime import datetime
-from queue import Queue
+from collections import deque
+from functools import partial, lru_cache
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from queue import Queue, Empty, Full
 from flask import Flask, render_template, request, jsonify, send_from_directory, Response
-from werkzeug.utils import secure_filename
+from flask.json.provider import DefaultJSONProvider
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    from waitress import serve as waitress_serve
+except ImportError:
+    waitress_serve = None
 
 from process_generated_content import save_data_to_excel
-from bilibili_subtitle_downloader import BilibiliSubtitleDownloader, load_cookies_from_file
+from bilibili_subtitle_downloader import BilibiliSubtitleDownloader, load_cookies_from_file, is_favorite_url, extract_fid, create_session
 from process_video_info import sanitize_filename
-from subtitle_summarizer import SRTParser, SubtitleSummarizer, load_llm_config
+from subtitle_summarizer import SRTParser, SubtitleSummarizer, load_llm_config, LONG_SUBTITLE_CHARS
 from llm_client import OpenAICompatClient
+from llm_cache import LLMCache
+from file_utils import atomic_write_bytes
+from semantic_cache import SemanticCache
 from define import create_empty_course
 
 # course.json 中 category 允许的取值（与前端一致）；缺失或非法时保存前补为默认值
 _COURSE_CATEGORIES_ALLOWED = frozenset({'职业技能', '文化基础', '工具使用', '人文素养'})
 _DEFAULT_COURSE_CATEGORY = '职业技能'
 
+class OrjsonProvider(DefaultJSONProvider):
+    """使用 orjson 序列化API响应（直接输出UTF-8，中文不转义）"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 # 确定模板目录
 if getattr(sys, 'frozen', False):
     # 如果是PyInstaller打包环境
@@ -40,19 +68,126 @@ else:
     app = Flask(__name__, static_folder='templates', static_url_path='')
 
 app.config['JSON_AS_ASCII'] = False  # 支持中文JSON
-
-# 全局变量存储任务状态
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+app.json.ensure_ascii = False
+app.json.compact = True  # 响应不做缩进美化，调试模式下也一样
+
+# JSON 响应超过该大小（字节）且浏览器支持时用 gzip 压缩；压缩级别取 1，CPU 开销可忽略
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 1
+
+
+@app.after_request
+def gzip_json_response(response):
+    """压缩较大的JSON响应（任务列表轮询时中文内容压缩率很高）"""
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.headers.get('Accept-Encoding', '')):
+        return response
+    data = response.get_data()
+    if len(data) < GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+# 全局变量存储任务状态（task_id -> Task）
+# 写时复制：字典发布后不再修改，增删任务时在 tasks_lock 内生成新字典再替换引用，
+# 读取方直接使用当前引用即可，无需加锁；任务内部状态由各自的 Task.lock 保护
 tasks = {}
 tasks_lock = threading.Lock()
 
+# 共享下载器缓存：(cookies_file, 文件签名, ffmpeg_path) -> (下载器, 创建时间)
+_downloader_cache = {}
+_downloader_cache_lock = threading.Lock()
+# 共享下载器的最长使用时间（秒），到期重建以刷新Wbi密钥
+DOWNLOADER_MAX_AGE = 3600
+# 最多同时缓存的下载器个数（不同Cookie文件/ffmpeg路径各占一个）
+MAX_CACHED_DOWNLOADERS = 8
+# 所有下载器共用的B站HTTP会话：下载器按小时重建，连接池不随之丢弃
+_bili_session = create_session()
+# 共享LLM客户端：(api_base, api_key, model_name) -> OpenAICompatClient
+_llm_clients = {}
+_llm_clients_lock = threading.Lock()
+# 每个 provider（api_base）同时进行的LLM请求上限，模型配置中的 max_parallel 可覆盖
+PROVIDER_MAX_PARALLEL = 8
+_provider_semaphores = {}
+
+# 任务全局版本号：任一任务创建或变更时递增，作为 /api/tasks 的 ETag
+tasks_version = 0
+tasks_version_lock = threading.Lock()
+
+# SSE 订阅者：事件队列 -> 关注的任务ID（None 表示全部任务），每个连接对应一个队列
+task_subscribers = {}
+task_subscribers_lock = threading.Lock()
+# 无事件时发送心跳的间隔（秒），避免代理或浏览器断开空闲连接
+SSE_HEARTBEAT_INTERVAL = 15
+
 # 任务队列：用于限制并发数量
-task_queue = Queue()
+# 队列上限：防止一次提交超大收藏夹时排队任务无限增长占满内存
+TASK_QUEUE_MAXSIZE = 1000
+task_queue = Queue(maxsize=TASK_QUEUE_MAXSIZE)
 # 最大并发任务数（可以根据API限制调整）
 MAX_CONCURRENT_TASKS = 2  # 默认同时最多处理2个视频
+# waitress 处理HTTP请求的线程数
+WEB_SERVER_THREADS = 16
+# 每个任务内并发生成的LLM步骤数
+LLM_WORKERS_PER_TASK = 4
+# 流式生成时把部分结果写入任务状态的最小间隔（秒）
+PARTIAL_OUTPUT_INTERVAL = 0.2
+
+# LLM响应缓存：同一模型、同一字幕的生成结果可直接复用
+llm_cache = LLMCache('config/llm_cache')
+# 精确缓存未命中时按内容相似度查找可复用的结果
+semantic_cache = SemanticCache('config/llm_cache/semantic_index.json')
+
+# 输出目录下记录已完成视频的清单文件名
+COMPLETED_MANIFEST_NAME = '.completed_videos.json'
+# 专用文件写入线程：生成结果的落盘不占用任务线程
+_file_write_queue = Queue()
+_file_writer_started = False
+_file_writer_lock = threading.Lock()
+# 写入线程单次最多批量处理的文件数
+FILE_WRITER_BATCH_SIZE = 64
+# 后处理线程（低优先级）：写入 Section 数据等收尾工作，不占用任务工作线程
+_post_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='PostProcess')
+# SRT 文件达到该大小才交给进程池解析，小文件在当前线程解析更快
+CPU_POOL_MIN_SRT_SIZE = 256 * 1024
+# 解析大字幕文件用的进程池（首次需要时创建）
+_cpu_pool = None
+_cpu_pool_lock = threading.Lock()
+# 所有任务共用的LLM调用线程池（首次需要时创建），连接和线程在任务之间复用
+_llm_pool = None
+_llm_pool_lock = threading.Lock()
+# 已结束任务在内存中保留的默认时间（秒）及清理检查间隔
+TASK_TTL = 3600
+TASK_EVICT_INTERVAL = 60
+# LLM缓存目录中过期条目的清理间隔（秒），服务启动后的第一轮清理时即执行一次
+LLM_CACHE_SWEEP_INTERVAL = 6 * 3600
+# 内存中最多保留的已结束任务数
+MAX_FINISHED_TASKS = 200
+# 最近移除的任务：(移除时的版本号, 任务ID)，供 since 增量查询返回 removed；只保留最近的记录
+REMOVED_TASKS_HISTORY = 1000
+removed_tasks = deque(maxlen=REMOVED_TASKS_HISTORY)
 # 工作线程启动标志
 worker_threads_started = False
 worker_threads_lock = threading.Lock()
 
+# 配置文件缓存：路径 -> (文件 (mtime_ns, size), 解析结果)，save_* 时删除对应条目强制重新读取
+_json_file_cache = {}
+_json_file_cache_lock = threading.Lock()
+
+# 本进程的启动标识，作为配置文件 ETag 的一部分
+_PROCESS_TAG = format(int(time.time()), 'x')
+
+# 工作区/输出目录允许的字符（含 Windows 盘符与分隔符），限制长度避免异常输入
+SAFE_DIR_RE = re.compile(r'^[\w\-./\\: ]{1,260}$')
+
 
 class TaskStatus:
     """任务状态类"""
@@ -65,24 +200,375 @@ class TaskStatus:
     STOPPED = "stopped"    # 已停止
 
 
+# 已结束的任务状态：进入这些状态后任务不会再变化，超过 task_ttl 后从内存中移除
+FINISHED_STATUSES = (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.STOPPED)
+
+
+def is_safe_dir(path):
+    """
+    检查用户提供的目录路径是否安全
+
+    Args:
+        path: 目录路径
+
+    Returns:
+        bool: 只包含允许的字符且没有 .. 路径段时返回True
+    """
+    if not path or not SAFE_DIR_RE.match(path):
+        return False
+    return '..' not in re.split(r'[\\/]', path)
+
+
+def _file_etag(path):
+    """
+    根据配置文件签名生成 ETag，带上进程启动标识（升级后默认配置可能变化，不能沿用旧响应）
+    
+    Returns:
+        ETag 字符串；文件不存在时返回None
+    """
+    signature = _file_signature(path)
+    if signature is None:
+        return None
+    return f'"{_PROCESS_TAG}-{signature[0]}-{signature[1]}"'
+
+
+def _etag_json_response(etag, build_payload):
+    """
+    客户端携带的 If-None-Match 与 etag 一致时返回 304，否则调用 build_payload 生成JSON响应
+    
+    Args:
+        etag: 当前内容的 ETag（None 表示不支持缓存验证）
+        build_payload: 生成响应内容的无参函数
+    """
+    if etag is not None and request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+    response = jsonify(build_payload())
+    if etag is not None:
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _new_id():
+    """生成22个字符的随机ID（uuid4 的 base64url 编码，可直接用于URL）"""
+    return base64.urlsafe_b64encode(uuid.uuid4().bytes).rstrip(b'=').decode('ascii')
+
+
+def _add_tasks(new_tasks):
+    """登记新任务：复制字典后整体替换，读取方始终看到完整的字典"""
+    global tasks
+    with tasks_lock:
+        updated = dict(tasks)
+        for task in new_tasks:
+            updated[task.id] = task
+        tasks = updated
+
+
+def _remove_tasks(task_ids):
+    """移除任务（写时复制），记录移除时的版本号并通知 SSE 订阅者"""
+    global tasks
+    with tasks_lock:
+        updated = dict(tasks)
+        removed = [task_id for task_id in task_ids if updated.pop(task_id, None) is not None]
+        tasks = updated
+    if not removed:
+        return
+    version = _next_tasks_version()
+    removed_tasks.extend((version, task_id) for task_id in removed)
+    _publish_tasks_removed(removed)
+
+
+def _next_tasks_version():
+    """任务集合发生任何变化时调用，返回新的全局版本号"""
+    global tasks_version
+    with tasks_version_lock:
+        tasks_version += 1
+        return tasks_version
+
+
+class Task:
+    """
+    单个任务的运行状态
+
+    每个任务自带一把锁和一个停止事件：工作线程更新状态时只锁住自己的任务，
+    轮询停止标志也无需加锁；全局 tasks_lock 只用于串行化 tasks 字典的增删。
+    """
+    __slots__ = ('id', 'url', 'status', 'message', 'created_at', 'details', 'lock', 'stop_event', 'version',
+                 'finished_at')
+
+    def __init__(self, task_id, url, message, created_at=None):
+        self.id = task_id
+        self.url = url
+        self.status = TaskStatus.PENDING
+        self.message = message
+        self.created_at = created_at or datetime.now().isoformat()
+        # 可选字段：video_dir, video_title, subtitle_file, files, completed_at, error
+        self.details = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        # 最近一次变更时的全局版本号，用于增量轮询
+        self.version = _next_tasks_version()
+        # 进入结束状态的时间（time.monotonic()），用于过期清理
+        self.finished_at = None
+
+    def update(self, status=None, message=None, **details):
+        """更新任务状态（只持有本任务的锁）"""
+        with self.lock:
+            if status is not None:
+                self.status = status
+                if status in FINISHED_STATUSES:
+                    self.finished_at = time.monotonic()
+            if message is not None:
+                self.message = message
+            if details:
+                self.details.update(details)
+            self.version = _next_tasks_version()
+        _publish_task_event(self)
+
+    def set_partial(self, field, text):
+        """
+        记录流式生成中的部分内容（只持有本任务的锁）
+
+        不更新版本号：部分内容每隔几百毫秒变化一次，不应让 /api/tasks 的 ETag 和 since 增量随之失效；
+        只推送给订阅该任务的 SSE 连接
+        """
+        with self.lock:
+            self.details[field] = text
+        _publish_task_event(self, partial_only=True)
+
+    def check_stop(self):
+        """检查停止标志，若已请求停止则把任务标记为已停止并返回True"""
+        if not self.stop_event.is_set():
+            return False
+        self.update(status=TaskStatus.STOPPED, message='任务已停止')
+        return True
+
+    def to_dict(self):
+        """生成供API返回的任务快照"""
+        with self.lock:
+            data = {
+                'id': self.id,
+                'url': self.url,
+                'status': self.status,
+                'message': self.message,
+                'created_at': self.created_at,
+                'version': self.version,
+            }
+            data.update(self.details)
+        if self.stop_event.is_set():
+            data['stop_flag'] = True
+        return data
+
+
+def _publish_task_event(task, partial_only=False):
+    """
+    把任务的最新快照推送给 SSE 订阅者（每种快照只序列化一次）
+
+    订阅全部任务的连接收到的快照不含 partial_summary（否则每次推送都要重发已生成的全部内容），需要时订阅单个任务
+
+    Args:
+        task: 发生变化的任务
+        partial_only: 只有流式生成的部分内容变化，此时只推送给订阅该任务的连接
+    """
+    with task_subscribers_lock:
+        task_queues = [queue for queue, task_filter in task_subscribers.items() if task_filter == task.id]
+        all_queues = [] if partial_only else [queue for queue, task_filter in task_subscribers.items()
+                                              if task_filter is None]
+    if not task_queues and not all_queues:
+        return
+    data = task.to_dict()
+    if task_queues:
+        _put_event(task_queues, f"event: task\ndata: {_json_dumps(data)}\n\n")
+    if all_queues:
+        data.pop('partial_summary', None)
+        _put_event(all_queues, f"event: task\ndata: {_json_dumps(data)}\n\n")
+
+
+def _publish_tasks_removed(task_ids):
+    """向订阅全部任务或被移除任务的 SSE 连接推送 task_removed 事件"""
+    payloads = {task_id: f"event: task_removed\ndata: {_json_dumps({'id': task_id})}\n\n" for task_id in task_ids}
+    with task_subscribers_lock:
+        targets = [(queue, task_filter) for queue, task_filter in task_subscribers.items()
+                   if task_filter is None or task_filter in payloads]
+    for queue, task_filter in targets:
+        for payload in (payloads.values() if task_filter is None else (payloads[task_filter],)):
+            _put_event((queue,), payload)
+
+
+def _put_event(queues, payload):
+    """把一条 SSE 事件放入各订阅者的队列"""
+    for queue in queues:
+        try:
+            queue.put_nowait(payload)
+        except Full:
+            # 客户端消费过慢时丢弃本条事件，后续事件仍会带上完整状态
+            pass
+
+
+def _get_cpu_pool():
+    """获取解析用进程池；PyInstaller 打包环境下不启用多进程，返回None"""
+    global _cpu_pool
+    if getattr(sys, 'frozen', False):
+        return None
+    with _cpu_pool_lock:
+        if _cpu_pool is None:
+            _cpu_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+        return _cpu_pool
+
+
+def _parse_subtitle(func, path):
+    """
+    执行字幕解析函数，大文件放到进程池中执行以免占用 GIL 拖慢其他任务和 Web 请求
+    
+    Args:
+        func: SRTParser 的解析函数（需可被 pickle）
+        path: SRT 文件路径
+        
+    Returns:
+        解析函数的返回值
+    """
+    pool = None
+    try:
+        if os.path.getsize(path) >= CPU_POOL_MIN_SRT_SIZE:
+            pool = _get_cpu_pool()
+    except OSError:
+        pass
+    if pool is None:
+        return func(path)
+    return pool.submit(func, path).result()
+
+
+@lru_cache(maxsize=32)
+def _subtitle_texts_cached(path, signature):
+    """解析一次SRT，返回 (带时间标签的文本, 纯文本)；signature 为文件 (mtime_ns, size)，文件变化后自动失效"""
+    return _parse_subtitle(SRTParser.parse_for_llm, path)
+
+
+class _SubtitleCache:
+    """
+    单个字幕文件解析结果的缓存
+
+    四个生成步骤共用同一份解析结果，首次访问时才读取并解析SRT文件（只解析一次，同时得到两种文本）；
+    解析结果同时按 (路径, 文件签名) 缓存在进程内，任务失败重试时无需重新解析。
+    """
+
+    def __init__(self, path):
+        self._path = os.path.abspath(path)
+        self._texts = None
+
+    def _parsed(self):
+        if self._texts is None:
+            self._texts = _subtitle_texts_cached(self._path, _file_signature(self._path))
+        return self._texts
+
+    @property
+    def subtitle_text(self):
+        """带时间标签、供要点总结使用的字幕文本"""
+        return self._parsed()[0]
+
+    @property
+    def plain_text(self):
+        """去除时间标签和序号后的纯文本"""
+        return self._parsed()[1]
+
+
+def _json_dumps(obj):
+    """序列化为紧凑的 JSON 字符串（安装了 orjson 时用它）"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _json_loads(data: bytes):
+    """解析UTF-8编码的JSON字节（安装了 orjson 时用它）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode('utf-8'))
+
+
+def _read_json(filepath):
+    """读取JSON文件（安装了 orjson 时用它解析，直接处理UTF-8字节）"""
+    with open(filepath, 'rb') as f:
+        return _json_loads(f.read())
+
+
+def _json_bytes(obj):
+    """序列化为带缩进的 JSON 字节（安装了 orjson 时用它）"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def _atomic_write_json(filepath, obj):
+    """原子写入 JSON 文件"""
+    atomic_write_bytes(filepath, _json_bytes(obj))
+
+
+def _atomic_write_text(filepath, text):
+    """原子写入文本文件"""
+    atomic_write_bytes(filepath, text.encode('utf-8'))
+
+
+def _file_signature(path):
+    """文件的 (mtime_ns, size)，用作缓存键以便文件修改后自动失效；文件不存在时返回None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _load_json_cached(path):
+    """
+    读取JSON配置文件，文件 (mtime_ns, size) 未变化时直接返回上次解析的结果
+    
+    返回的对象在多个调用方之间共享，调用方需要修改时应先复制。
+    
+    Args:
+        path: 文件路径
+        
+    Returns:
+        解析后的对象；文件不存在时返回None
+    """
+    signature = _file_signature(path)
+    if signature is None:
+        return None
+    entry = _json_file_cache.get(path)
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+    with _json_file_cache_lock:
+        data = _read_json(path)
+        _json_file_cache[path] = (signature, data)
+    return data
+
+
+def _invalidate_json_cache(path):
+    """写入配置文件后调用，确保下次读取时重新解析"""
+    _json_file_cache.pop(path, None)
+
+
 def load_models():
-    """加载模型配置"""
-    config_file = 'config/llm_models.json'
-    if not os.path.exists(config_file):
+    """加载模型配置（文件未修改时直接返回缓存的副本）"""
+    config = _load_json_cached('config/llm_models.json')
+    if config is None:
         return []
-    
-    with open(config_file, 'r', encoding='utf-8') as f:
-        config = json.load(f)
-        return config.get('models', [])
+    return copy.deepcopy(config.get('models', []))
+
+
+def load_models_dict():
+    """加载模型配置，返回 模型ID -> 模型 的有序字典，便于按ID查找和修改"""
+    return {model['id']: model for model in load_models()}
 
 
 def save_models(models):
-    """保存模型配置"""
+    """保存模型配置（models 可以是列表，也可以是 load_models_dict 返回的字典）"""
     config_file = 'config/llm_models.json'
     os.makedirs(os.path.dirname(config_file), exist_ok=True)
     
-    with open(config_file, 'w', encoding='utf-8') as f:
-        json.dump({'models': models}, f, ensure_ascii=False, indent=2)
+    if isinstance(models, dict):
+        models = list(models.values())
+    _atomic_write_json(config_file, {'models': models})
+    _invalidate_json_cache(config_file)
 
 
 def load_app_config():
@@ -99,24 +585,31 @@ def load_app_config():
         'web_port': 7200,
         'download_all_parts': False,  # 默认关闭：只下载URL指定的视频，不下载所有分P
         'max_concurrent_tasks': 2,  # 最大并发任务数：默认同时处理2个视频（避免API并发过高）
+        'task_ttl': 3600,  # 已结束任务在任务列表中保留的秒数，0 表示一直保留
+        'max_finished_tasks': 200,  # 任务列表中最多保留的已结束任务数，0 表示不限
+        'llm_cache_enabled': True,  # 相同模型、相同字幕的生成结果直接复用本地缓存
+        'semantic_cache_threshold': 0,  # 字幕内容相似度达到该值（如 0.95）时复用已缓存结果，0 表示只做精确匹配
+        'batch_llm': False,  # 多个分P的较短字幕合并为一次请求生成要点总结（需要模型能力较强）
         'ffmpeg_path': 'ffmpeg',
+        'debug': False,  # Flask 调试模式（开发服务器 + 调试器），生产环境保持关闭
+        'web_threads': 16,  # waitress 处理HTTP请求的线程数
+        'llm_workers_per_task': 4,  # 每个任务并发调用LLM的线程数（总结、完整文档、练习题、预设问题并行生成）
         # 课程库 HTTP 服务（提交课程、删除课程）；前端 POST /api/courses/* 由本服务转发至此
         'courses_api_base': 'http://127.0.0.1:7100',
     }
     
-    if not os.path.exists(config_file):
-        # 如果配置文件不存在，创建默认配置
-        save_app_config(default_config)
-        return default_config
-    
     try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            # 合并默认配置，确保所有字段都存在
-            for key, value in default_config.items():
-                if key not in config:
-                    config[key] = value
-            return config
+        cached = _load_json_cached(config_file)
+        if cached is None:
+            # 如果配置文件不存在，创建默认配置
+            save_app_config(default_config)
+            return default_config
+        config = copy.deepcopy(cached)
+        # 合并默认配置，确保所有字段都存在
+        for key, value in default_config.items():
+            if key not in config:
+                config[key] = value
+        return config
     except Exception as e:
         print(f"加载配置失败: {e}，使用默认配置")
         return default_config
@@ -127,20 +620,17 @@ def save_app_config(config):
     config_file = 'config/app_config.json'
     os.makedirs(os.path.dirname(config_file), exist_ok=True)
     
-    with open(config_file, 'w', encoding='utf-8') as f:
-        json.dump(config, f, ensure_ascii=False, indent=2)
+    _atomic_write_json(config_file, config)
+    _invalidate_json_cache(config_file)
 
 
 def load_workspaces():
-    """加载工作区配置"""
-    config_file = 'config/workspace.json'
-    if not os.path.exists(config_file):
-        return []
-    
+    """加载工作区配置（文件未修改时直接返回缓存的副本）"""
     try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data.get('workspaces', [])
+        data = _load_json_cached('config/workspace.json')
+        if data is None:
+            return []
+        return copy.deepcopy(data.get('workspaces', []))
     except Exception as e:
         print(f"加载工作区配置失败: {e}")
         return []
@@ -151,8 +641,105 @@ def save_workspaces(workspaces):
     config_file = 'config/workspace.json'
     os.makedirs(os.path.dirname(config_file), exist_ok=True)
     
-    with open(config_file, 'w', encoding='utf-8') as f:
-        json.dump({'workspaces': workspaces}, f, ensure_ascii=False, indent=2)
+    _atomic_write_json(config_file, {'workspaces': workspaces})
+    _invalidate_json_cache(config_file)
+
+
+@lru_cache(maxsize=8)
+def _load_cookies_cached(cookies_file, signature):
+    return load_cookies_from_file(cookies_file)
+
+
+def load_cookies(cookies_file):
+    """加载Cookie（文件未修改时直接使用缓存）"""
+    return dict(_load_cookies_cached(cookies_file, _file_signature(cookies_file)))
+
+
+@lru_cache(maxsize=16)
+def _load_llm_config_cached(config_file, model_name, signature):
+    return load_llm_config(config_file, model_name=model_name)
+
+
+def get_llm_config(model_name, config_file='config/llm_models.json'):
+    """按模型名称加载LLM配置（配置文件未修改时直接使用缓存）"""
+    return dict(_load_llm_config_cached(config_file, model_name, _file_signature(config_file)))
+
+
+def get_llm_client(model_config):
+    """
+    获取共享的LLM客户端实例
+    
+    相同 api_base、api_key 和模型的任务共用一个客户端，从而共用其HTTP连接池；
+    同一 api_base 的客户端共用一个信号量，限制发往该 provider 的并发请求数
+    
+    Args:
+        model_config: get_llm_config 返回的模型配置
+        
+    Returns:
+        OpenAICompatClient 实例
+    """
+    key = (model_config['api_base'], model_config['api_key'], model_config['model_name'])
+    client = _llm_clients.get(key)
+    if client is None:
+        with _llm_clients_lock:
+            client = _llm_clients.get(key)
+            if client is None:
+                api_base = model_config['api_base']
+                # 同一 api_base 的所有模型共用一个信号量，以该 provider 首次使用时的配置为准
+                semaphore = _provider_semaphores.get(api_base)
+                if semaphore is None:
+                    max_parallel = max(1, int(model_config.get('max_parallel') or PROVIDER_MAX_PARALLEL))
+                    semaphore = _provider_semaphores[api_base] = threading.BoundedSemaphore(max_parallel)
+                client = OpenAICompatClient(
+                    api_base=api_base,
+                    api_key=model_config['api_key'],
+                    default_model=model_config['model_name'],
+                    request_timeout=500,
+                    concurrency_limit=semaphore
+                )
+                _llm_clients[key] = client
+    return client
+
+
+def get_downloader(cookies_file, ffmpeg_path=None):
+    """
+    获取共享的下载器实例
+    
+    同一Cookie文件（内容未变化）和ffmpeg路径的任务共用一个下载器，避免每个任务重复获取Wbi密钥；
+    实例超过 DOWNLOADER_MAX_AGE 秒后重建，以便刷新每日轮换的Wbi密钥。
+    
+    Args:
+        cookies_file: Cookie文件路径
+        ffmpeg_path: FFmpeg路径
+        
+    Returns:
+        BilibiliSubtitleDownloader 实例
+    """
+    key = (cookies_file, _file_signature(cookies_file), ffmpeg_path)
+    now = time.time()
+    with _downloader_cache_lock:
+        cached = _downloader_cache.get(key)
+        if cached is not None and now - cached[1] < DOWNLOADER_MAX_AGE:
+            return cached[0]
+        cookies = load_cookies(cookies_file)
+        downloader = BilibiliSubtitleDownloader(
+            sessdata=cookies.get('sessdata'),
+            bili_jct=cookies.get('bili_jct'),
+            buvid3=cookies.get('buvid3'),
+            debug=False,
+            ffmpeg_path=ffmpeg_path,
+            session=_bili_session
+        )
+        # 清掉过期的实例，以及同一Cookie文件修改前的旧实例（不会再被命中）；其他工作区的实例保留
+        for old_key, (_, created) in list(_downloader_cache.items()):
+            if now - created >= DOWNLOADER_MAX_AGE or (old_key[0], old_key[2]) == (cookies_file, ffmpeg_path):
+                del _downloader_cache[old_key]
+        # 仍超出上限时丢弃最早创建的实例
+        while len(_downloader_cache) >= MAX_CACHED_DOWNLOADERS:
+            oldest = min(_downloader_cache, key=lambda k: _downloader_cache[k][1])
+            del _downloader_cache[oldest]
+        _downloader_cache[key] = (downloader, now)
+        return downloader
 
 
 def start_worker_threads():
@@ -172,10 +759,69 @@ def start_worker_threads():
             worker = threading.Thread(target=task_queue_worker, daemon=True, name=f"Worker-{i+1}")
             worker.start()
         
+        threading.Thread(target=_task_evictor_loop, daemon=True, name="TaskEvictor").start()
+        # 相似缓存索引只需读取一次，启动时在后台预读
+        if load_app_config().get('semantic_cache_threshold', 0):
+            threading.Thread(target=semantic_cache.preload, daemon=True, name="CacheWarmup").start()
+        
         worker_threads_started = True
         print(f"✅ 工作线程池已启动（{max_concurrent} 个线程）")
 
 
+def evict_finished_tasks(ttl=None, max_finished=None):
+    """
+    从内存中移除已结束的任务（生成的文件仍保留在磁盘上）
+    
+    Args:
+        ttl: 任务结束后保留的秒数，None 表示不按时间清理；0 表示清理所有已结束任务
+        max_finished: 最多保留的已结束任务数（保留最近结束的），None 表示不限
+        
+    Returns:
+        移除的任务数
+    """
+    finished = sorted((task for task in tasks.values() if task.finished_at is not None),
+                      key=lambda task: task.finished_at)
+    expired = []
+    if ttl is not None:
+        deadline = time.monotonic() - ttl
+        expired = [task for task in finished if task.finished_at <= deadline]
+    if max_finished is not None and len(finished) - len(expired) > max_finished:
+        # finished 按结束时间升序，超过 TTL 的任务必然排在最前面
+        expired = finished[:len(finished) - max_finished]
+    if expired:
+        _remove_tasks(task.id for task in expired)
+    return len(expired)
+
+
+def _task_evictor_loop():
+    """
+    后台线程：每隔 TASK_EVICT_INTERVAL 秒清理过期任务（task_ttl、max_finished_tasks 配置为 0 时不做对应清理），
+    每隔 LLM_CACHE_SWEEP_INTERVAL 秒清理LLM缓存中的过期条目
+    """
+    last_cache_sweep = 0
+    while True:
+        time.sleep(TASK_EVICT_INTERVAL)
+        if time.time() - last_cache_sweep >= LLM_CACHE_SWEEP_INTERVAL:
+            last_cache_sweep = time.time()
+            try:
+                removed = llm_cache.sweep_expired()
+                if removed:
+                    print(f"🧹 已清理 {removed} 个过期的LLM缓存文件")
+            except Exception as e:
+                print(f"清理LLM缓存失败: {e}")
+        try:
+            config = load_app_config()
+            ttl = config.get('task_ttl', TASK_TTL)
+            max_finished = config.get('max_finished_tasks', MAX_FINISHED_TASKS)
+            if (ttl and ttl > 0) or (max_finished and max_finished > 0):
+                removed = evict_finished_tasks(ttl if ttl and ttl > 0 else None,
+                                               max_finished if max_finished and max_finished > 0 else None)
+                if removed:
+                    print(f"🧹 已清理 {removed} 个过期任务")
+        except Exception as e:
+            print(f"清理过期任务失败: {e}")
+
+
 def save_sections_to_json(video_dir, video_url, all_generated_files):
     """
     将生成的内容保存为 Section JSON 格式
@@ -300,7 +946,6 @@ def save_sections_to_json(video_dir, video_url, all_generated_files):
         video_subtitles = []
         if subtitle_file and os.path.exists(subtitle_file):
             try:
-                import re
                 with open(subtitle_file, 'r', encoding='utf-8') as f:
                     content = f.read()
                 
@@ -389,12 +1034,32 @@ def save_sections_to_json(video_dir, video_url, all_generated_files):
             sections_data.append(section_obj)
     
     # 保存 section.json
-    with open(section_file_name, 'w', encoding='utf-8') as f:
-        json.dump(sections_data, f, ensure_ascii=False, indent=2)
+    _atomic_write_json(section_file_name, sections_data)
     
     print(f"✅ Section数据已保存到: {section_file_name}")
 
 
+def _enqueue_batch(queue, items):
+    """
+    批量放入队列：只获取一次队列内部锁，等价于逐个调用 queue.put_nowait
+    
+    Args:
+        queue: queue.Queue 实例
+        items: 待放入的元素列表
+        
+    Raises:
+        Full: 有界队列剩余空间不足以放下全部元素时抛出，此时不放入任何元素
+    """
+    if not items:
+        return
+    with queue.mutex:
+        if 0 < queue.maxsize < len(queue.queue) + len(items):
+            raise Full
+        queue.queue.extend(items)
+        queue.unfinished_tasks += len(items)
+        queue.not_empty.notify(len(items))
+
+
 def task_queue_worker():
     """任务队列工作线程：从队列中取任务并执行"""
     thread_name = threading.current_thread().name
@@ -437,37 +1102,443 @@ def task_queue_worker():
             task_queue.task_done()
 
 
-def is_valid_summary(filepath):
-    if not os.path.exists(filepath): return False
+def _scan_dir(path):
+    """一次性列出目录内容：文件名 -> os.DirEntry；目录不存在时返回空字典"""
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return len(data.get('key_points', [])) > 0
+        with os.scandir(path) as it:
+            return {entry.name: entry for entry in it}
+    except OSError:
+        return {}
+
+def _file_exists(filepath, existing=None):
+    """existing 为 _scan_dir 的结果时直接查表，省去逐个 stat"""
+    if existing is None:
+        return os.path.exists(filepath)
+    return os.path.basename(filepath) in existing
+
+def is_valid_summary(filepath, existing=None):
+    if not _file_exists(filepath, existing): return False
+    try:
+        data = _read_json(filepath)
+        return len(data.get('key_points', [])) > 0
     except:
         return False
 
-def is_valid_content(filepath):
-    if not os.path.exists(filepath): return False
+def is_valid_content(filepath, existing=None):
+    if not _file_exists(filepath, existing): return False
+    if existing is not None:
+        return existing[os.path.basename(filepath)].stat().st_size > 100
     return os.path.getsize(filepath) > 100
 
-def is_valid_exercises(filepath):
-    if not os.path.exists(filepath): return False
+def is_valid_exercises(filepath, existing=None):
+    if not _file_exists(filepath, existing): return False
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return len(data.get('multiple_choice', [])) > 0 or len(data.get('short_answer', [])) > 0
+        data = _read_json(filepath)
+        return len(data.get('multiple_choice', [])) > 0 or len(data.get('short_answer', [])) > 0
     except:
         return False
 
-def is_valid_questions(filepath):
-    if not os.path.exists(filepath): return False
+def is_valid_questions(filepath, existing=None):
+    if not _file_exists(filepath, existing): return False
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return len(data) > 0
+        data = _read_json(filepath)
+        return len(data) > 0
     except:
         return False
 
+class _PendingWrite:
+    """提交给写入线程的一次文件写入，调用 wait() 等待落盘并获取可能的异常"""
+    __slots__ = ('filepath', 'data', 'done', 'error')
+
+    def __init__(self, filepath, data):
+        self.filepath = filepath
+        self.data = data
+        self.done = threading.Event()
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+
+
+def _file_writer_loop():
+    """写入线程：每次唤醒后取走队列中所有待写文件，批量原子写入"""
+    while True:
+        batch = [_file_write_queue.get()]
+        while len(batch) < FILE_WRITER_BATCH_SIZE:
+            try:
+                batch.append(_file_write_queue.get_nowait())
+            except Empty:
+                break
+        for pending in batch:
+            try:
+                atomic_write_bytes(pending.filepath, pending.data)
+            except Exception as e:
+                pending.error = e
+            finally:
+                pending.data = None
+                pending.done.set()
+
+
+def _write_file_async(filepath, data):
+    """
+    把写文件交给专用写入线程，调用方不必等待磁盘IO
+    
+    Args:
+        filepath: 目标文件路径
+        data: 要写入的字节
+        
+    Returns:
+        _PendingWrite，需要读取该文件前调用其 wait()
+    """
+    global _file_writer_started
+    if not _file_writer_started:
+        with _file_writer_lock:
+            if not _file_writer_started:
+                threading.Thread(target=_file_writer_loop, daemon=True, name='FileWriter').start()
+                _file_writer_started = True
+    pending = _PendingWrite(filepath, data)
+    _file_write_queue.put(pending)
+    return pending
+
+
+def _write_generation_result(filepath, result):
+    """
+    序列化LLM生成结果并交给写入线程：Markdown 直接写文本，其余写 JSON
+    
+    Returns:
+        _PendingWrite
+    """
+    if filepath.endswith('.md'):
+        data = result.encode('utf-8')
+    else:
+        data = _json_bytes(result)
+    return _write_file_async(filepath, data)
+
+
+def _llm_workers_per_task():
+    """每个任务同时发出的LLM请求数（配置项 llm_workers_per_task）"""
+    return max(1, int(load_app_config().get('llm_workers_per_task', LLM_WORKERS_PER_TASK)))
+
+
+def _get_llm_pool():
+    """
+    获取共享的LLM调用线程池
+    
+    线程数为 llm_workers_per_task × max_concurrent_tasks，即同时发往API的请求上限；
+    所有任务的生成步骤都提交到这里，不再为每个字幕单独创建和销毁线程池
+    """
+    global _llm_pool
+    if _llm_pool is None:
+        with _llm_pool_lock:
+            if _llm_pool is None:
+                max_tasks = max(1, int(load_app_config().get('max_concurrent_tasks', MAX_CONCURRENT_TASKS)))
+                _llm_pool = ThreadPoolExecutor(max_workers=_llm_workers_per_task() * max_tasks,
+                                               thread_name_prefix='LLM')
+    return _llm_pool
+
+
+def _run_generation_jobs(task, jobs, progress_prefix, pending_writes):
+    """
+    在共享的LLM线程池中并发执行同一字幕的多个生成步骤，每完成一步立即交给写入线程保存
+    
+    Args:
+        task: 当前任务（Task）
+        jobs: [(步骤名, 输出文件, 无参生成函数), ...]
+        progress_prefix: 进度消息前缀
+        pending_writes: 收集本次提交的文件写入（_PendingWrite），读取这些文件前需等待
+        
+    Returns:
+        全部完成返回True；任务被请求停止时返回False（未开始的步骤会被取消）
+    """
+    executor = _get_llm_pool()
+    futures = {executor.submit(fn): (label, filepath) for label, filepath, fn in jobs}
+    pending = set(futures)
+    finished = 0
+    try:
+        while pending:
+            # 带超时等待，以便及时响应停止请求
+            done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            for future in done:
+                label, filepath = futures[future]
+                pending_writes.append(_write_generation_result(filepath, future.result()))
+                finished += 1
+                task.update(message=f'{progress_prefix}: {label}已完成 ({finished}/{len(jobs)})')
+            if pending and task.stop_event.is_set():
+                return False
+        return True
+    finally:
+        # 正常结束时所有future均已完成；停止或出错时取消本任务尚未开始的步骤，不等待正在进行的请求
+        for future in pending:
+            future.cancel()
+
+
+def _manifest_path(output_dir):
+    """已完成视频清单文件路径：记录每个URL的输出目录和生成文件，用于重复提交时跳过处理"""
+    return os.path.join(output_dir, COMPLETED_MANIFEST_NAME)
+
+
+def _load_completed_manifest(output_dir):
+    """读取已完成视频清单（url -> 结果信息），文件不存在或损坏时返回空字典"""
+    try:
+        return _read_json(_manifest_path(output_dir))
+    except (OSError, ValueError):
+        return {}
+
+
+def _record_completed(output_dir, url, result):
+    """把视频的处理结果写入已完成清单（只在后处理线程中调用，写入天然串行）"""
+    manifest = _load_completed_manifest(output_dir)
+    manifest[url] = result
+    _atomic_write_json(_manifest_path(output_dir), manifest)
+
+
+def _find_completed_result(output_dir, url, download_all_parts, generate_options):
+    """
+    查找此前已完整处理过的视频结果
+    
+    Args:
+        output_dir: 输出目录
+        url: 视频URL
+        download_all_parts: 本次是否下载所有分P（需与记录一致）
+        generate_options: 本次需要生成的内容
+        
+    Returns:
+        清单中记录的结果字典；没有记录或任一产物缺失/无效时返回None
+    """
+    result = _load_completed_manifest(output_dir).get(url)
+    if not result or result.get('download_all_parts') != download_all_parts:
+        return None
+    generated_files = result.get('generated_files') or []
+    if not generated_files:
+        return None
+    
+    existing = _scan_dir(result.get('video_dir', ''))
+    checks = [
+        ('summary', 'summary', is_valid_summary),
+        ('full_content', 'content_md', is_valid_content),
+        ('exercises', 'exercises', is_valid_exercises),
+        ('questions', 'questions', is_valid_questions),
+    ]
+    for item in generated_files:
+        if not os.path.exists(item.get('subtitle_file', '')):
+            return None
+        for option, field, is_valid in checks:
+            if generate_options.get(option, True) and not is_valid(item[field], existing):
+                return None
+    return result
+
+
+def _finish_task(task, url, output_dir, download_all_parts, video_title, video_dir, cover_path, all_generated_files):
+    """
+    在后处理线程中写入 Section 数据，完成后把任务标记为完成并记录到已完成清单
+    """
+    task.update(message=f'正在写入Section数据: {video_title}...')
+    
+    completed_files = {
+        'video_dir': video_dir,
+        'cover': cover_path,
+        'generated_files': all_generated_files
+    }
+    total_files = len(all_generated_files)
+    
+    def save_and_record():
+        save_sections_to_json(video_dir, url, all_generated_files)
+        _record_completed(output_dir, url, dict(
+            completed_files,
+            title=video_title,
+            download_all_parts=download_all_parts
+        ))
+    
+    def on_sections_saved(future):
+        error = future.exception()
+        if error is not None:
+            task.update(status=TaskStatus.FAILED, message=f'错误: {str(error)}', error=str(error))
+            return
+        # 更新任务状态为完成
+        task.update(
+            status=TaskStatus.COMPLETED,
+            message=f'全部完成！已处理 {total_files} 个字幕文件，生成了字幕、封面、总结、完整文档、练习题和预设问题',
+            files=completed_files,
+            completed_at=datetime.now().isoformat()
+        )
+    
+    _post_pool.submit(save_and_record).add_done_callback(on_sections_saved)
+
+
+class _PartialOutput:
+    """
+    收集流式输出的片段，并按固定间隔把已生成的内容写入任务状态，供轮询或 SSE 展示生成进度
+    """
+
+    def __init__(self, task, field, interval=PARTIAL_OUTPUT_INTERVAL):
+        self._task = task
+        self._field = field
+        self._interval = interval
+        self._chunks = []
+        self._last_flush = 0.0
+
+    def __call__(self, chunk):
+        self._chunks.append(chunk)
+        now = time.monotonic()
+        if now - self._last_flush >= self._interval:
+            self._last_flush = now
+            self._task.set_partial(self._field, ''.join(self._chunks))
+
+
+def _stream_full_content(summarizer, plain_text, video_title, filepath):
+    """
+    流式生成完整文档：生成过程中的片段实时追加到 <filepath>.partial，便于查看进度；
+    流式请求的超时按片段间隔计算，长文档不会因总耗时超过 request_timeout 而失败
+    
+    Returns:
+        清理后的完整Markdown内容（最终文件仍由写入线程原子写入）
+    """
+    partial_path = f'{filepath}.partial'
+    try:
+        with open(partial_path, 'w', encoding='utf-8', buffering=1 << 16) as f:
+            return summarizer.generate_full_content(plain_text, video_title=video_title,
+                                                    stream=True, on_chunk=f.write)
+    finally:
+        try:
+            os.remove(partial_path)
+        except OSError:
+            pass
+
+
+def _cached_llm_call(model_key, kind, text, generate, is_valid=bool):
+    """
+    带缓存的LLM生成：命中缓存时直接返回，否则调用生成函数并把有效结果写入缓存
+    
+    Args:
+        model_key: 模型标识（api_base 与模型名）；为None时不使用缓存
+        kind: 生成内容类型
+        text: 输入文本
+        generate: 无参生成函数
+        is_valid: 判断结果是否值得缓存的函数
+        
+    Returns:
+        生成结果
+    """
+    if model_key is None:
+        return generate()
+    key = LLMCache.make_key(model_key, kind, text)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+    threshold = load_app_config().get('semantic_cache_threshold', 0)
+    if threshold:
+        similar_key = semantic_cache.find(model_key, kind, text, threshold)
+        if similar_key is not None:
+            cached = llm_cache.get(similar_key)
+            if cached is not None:
+                print(f"复用内容相似的已缓存结果: {kind}")
+                return cached
+    result = generate()
+    if is_valid(result):
+        llm_cache.set(key, result)
+        if threshold:
+            semantic_cache.add(model_key, kind, text, key)
+    return result
+
+
+def _has_key_points(summary):
+    return bool(summary.get('key_points'))
+
+
+def _has_content(content):
+    return bool(content and content.strip())
+
+
+def _has_questions(result):
+    return bool(result.get('questions')) and 'raw_response' not in result
+
+
+def _summarize_subtitle(summarizer, model_key, subtitle_text, on_chunk):
+    """
+    生成要点总结：长字幕先分段并行总结（各段结果单独缓存），再合并为整体总结
+    
+    Args:
+        summarizer: SubtitleSummarizer 实例
+        model_key: 模型标识，用于分段结果的缓存键
+        subtitle_text: 格式化后的字幕文本
+        on_chunk: 流式输出回调（只用于最终总结/合并步骤）
+        
+    Returns:
+        总结结果
+    """
+    if len(subtitle_text) <= LONG_SUBTITLE_CHARS:
+        return summarizer.summarize(subtitle_text, stream=True, on_chunk=on_chunk)
+    
+    chunks = SRTParser.split_for_llm(subtitle_text, LONG_SUBTITLE_CHARS)
+    print(f"字幕较长（{len(subtitle_text)} 字符），分 {len(chunks)} 段总结后合并")
+    # 分段请求用独立的小线程池：调用方本身运行在共享LLM线程池中，再向其提交任务并等待可能互相阻塞
+    with ThreadPoolExecutor(max_workers=min(len(chunks), _llm_workers_per_task()),
+                            thread_name_prefix='LLMChunk') as executor:
+        summaries = list(executor.map(
+            lambda chunk: _cached_llm_call(model_key, 'summary_chunk', chunk,
+                                           partial(summarizer.summarize, chunk), _has_key_points),
+            chunks))
+    return summarizer.combine_summaries(summaries, stream=True, on_chunk=on_chunk)
+
+
+def _batch_summarize(summarizer, model_key, entries, existing_files):
+    """
+    把多个分P中尚未生成的要点总结合并为一次LLM请求（字幕总长度不超过 LONG_SUBTITLE_CHARS 时）
+    
+    Args:
+        summarizer: SubtitleSummarizer 实例
+        model_key: 模型标识，先从缓存取已有的总结，批量结果按单个字幕写入缓存；为None时不使用缓存
+        entries: [(字幕文件, 总结文件), ...]
+        existing_files: _scan_dir 的结果
+        
+    Returns:
+        总结文件 -> 总结结果（含缓存命中的结果）；其余字幕不适合批量或批量失败时由调用方逐个总结
+    """
+    results = {}
+    pending = []
+    for path, summary_file in entries:
+        if is_valid_summary(summary_file, existing_files):
+            continue
+        text = _SubtitleCache(path).subtitle_text
+        if model_key is not None:
+            cached = llm_cache.get(LLMCache.make_key(model_key, 'summary', text))
+            if cached is not None:
+                results[summary_file] = cached
+                continue
+        pending.append((summary_file, text))
+    if len(pending) < 2 or sum(len(text) for _, text in pending) > LONG_SUBTITLE_CHARS:
+        return results
+    try:
+        summaries = summarizer.summarize_batch([text for _, text in pending])
+    except Exception as e:
+        print(f"批量总结失败，改为逐个总结: {e}")
+        return results
+    if summaries is None:
+        return results
+    
+    threshold = load_app_config().get('semantic_cache_threshold', 0)
+    for (summary_file, text), summary in zip(pending, summaries):
+        if _has_key_points(summary):
+            results[summary_file] = summary
+            if model_key is not None:
+                key = LLMCache.make_key(model_key, 'summary', text)
+                llm_cache.set(key, summary)
+                # 与 _cached_llm_call 一致，登记到相似输入缓存
+                if threshold:
+                    semantic_cache.add(model_key, 'summary', text, key)
+    return results
+
+
+def _subtitle_title(subtitle_file):
+    """从字幕文件路径提取标题，如 .../标题_zh-CN.srt -> 标题"""
+    base = os.path.basename(subtitle_file)
+    stem = base.rpartition('.')[0] or base
+    title, sep, _ = stem.rpartition('_')
+    return title if sep else stem
+
+
 def process_video_task(task_id, thread_name, url, output_dir, model_name, cookies_file, custom_folder_name=None, download_all_parts=False, generate_options=None, ffmpeg_path=None):
     """处理单个视频的下载和总结任务"""
     if generate_options is None:
@@ -477,31 +1548,27 @@ def process_video_task(task_id, thread_name, url, output_dir, model_name, cookie
             'exercises': True,
             'questions': True
         }
+    task = tasks[task_id]
     try:
         # 检查停止标志
-        with tasks_lock:
-            if tasks[task_id].get('stop_flag'):
-                tasks[task_id]['status'] = TaskStatus.STOPPED
-                tasks[task_id]['message'] = '任务已停止'
-                return
+        if task.check_stop():
+            return
+        
+        # 快速路径：该视频此前已处理完成且所有产物仍然有效时，跳过下载和LLM生成
+        completed = _find_completed_result(output_dir, url, download_all_parts, generate_options)
+        if completed is not None:
+            video_title = completed.get('title', '')
+            task.update(video_dir=completed['video_dir'], video_title=video_title,
+                        message=f'已有完整处理结果，跳过下载和生成: {video_title}')
+            _finish_task(task, url, output_dir, download_all_parts, video_title, completed['video_dir'],
+                         completed.get('cover'), completed['generated_files'])
+            return
         
         # 更新状态：下载中
-        with tasks_lock:
-            tasks[task_id]['status'] = TaskStatus.DOWNLOADING
-            tasks[task_id]['message'] = f'正在下载字幕: {url}'
+        task.update(status=TaskStatus.DOWNLOADING, message=f'正在下载字幕: {url}')
         
-        # 加载Cookie
-        config_cookies = load_cookies_from_file(cookies_file)
-        sessdata = config_cookies.get('sessdata')
-        
-        # 创建下载器
-        downloader = BilibiliSubtitleDownloader(
-            sessdata=sessdata,
-            bili_jct=config_cookies.get('bili_jct'),
-            buvid3=config_cookies.get('buvid3'),
-            debug=False,
-            ffmpeg_path=ffmpeg_path
-        )
+        # 获取下载器（同一Cookie文件的任务共用）
+        downloader = get_downloader(cookies_file, ffmpeg_path)
         
         # 下载字幕和封面
         download_result = downloader.download(
@@ -526,186 +1593,138 @@ def process_video_task(task_id, thread_name, url, output_dir, model_name, cookie
             raise Exception('此视频没有字幕，无法进行总结')
         
         # 检查停止标志
-        with tasks_lock:
-            if tasks[task_id].get('stop_flag'):
-                tasks[task_id]['status'] = TaskStatus.STOPPED
-                tasks[task_id]['message'] = '任务已停止'
-                return
+        if task.check_stop():
+            return
         
         # 更新任务基本信息
-        with tasks_lock:
-            tasks[task_id]['video_dir'] = video_dir
-            tasks[task_id]['video_title'] = video_title
+        task.update(video_dir=video_dir, video_title=video_title)
         
         # 加载LLM配置
-        llm_config_file = 'config/llm_models.json'
-        model_config = load_llm_config(llm_config_file, model_name=model_name)
+        model_config = get_llm_config(model_name)
         
         # 创建LLM客户端
-        llm_client = OpenAICompatClient(
-            api_base=model_config['api_base'],
-            api_key=model_config['api_key'],
-            default_model=model_config['model_name'],
-            request_timeout=500
-        )
+        llm_client = get_llm_client(model_config)
         
         # 创建总结器
         summarizer = SubtitleSummarizer(llm_client)
+        app_config = load_app_config()
+        # 关闭 llm_cache_enabled 时 model_key 为 None，所有生成步骤都直接调用LLM
+        model_key = None
+        if app_config.get('llm_cache_enabled', True):
+            model_key = f"{model_config['api_base']}|{model_config['model_name']}"
         
         # 存储所有生成的文件
         all_generated_files = []
+        # 交给写入线程、尚未确认落盘的文件
+        pending_writes = []
+        
+        # 一次性获取输出目录中已有的文件，用于判断各步骤结果是否已存在
+        existing_files = _scan_dir(video_dir)
         
         # 遍历所有下载的中文字幕文件
         total_files = len(downloaded_files)
-        for file_index, subtitle_file in enumerate(downloaded_files, 1):
+        # 从字幕文件名中提取标题（去掉扩展名和最后一个下划线后的语言后缀）
+        subtitle_entries = [(path, _subtitle_title(path)) for path in downloaded_files]
+        
+        # 多个分P时可把较短字幕的要点总结合并为一次请求（需要模型能稳定输出多段JSON，默认关闭）
+        batched_summaries = {}
+        if generate_options.get('summary', True) and app_config.get('batch_llm', False):
+            task.update(message=f'批量生成 {total_files} 个字幕的要点总结...')
+            batched_summaries = _batch_summarize(
+                summarizer, model_key,
+                [(path, os.path.join(video_dir, f'{title}_summary.json')) for path, title in subtitle_entries],
+                existing_files)
+        
+        for file_index, (subtitle_file, subtitle_title) in enumerate(subtitle_entries, 1):
             # 检查停止标志
-            with tasks_lock:
-                if tasks[task_id].get('stop_flag'):
-                    tasks[task_id]['status'] = TaskStatus.STOPPED
-                    tasks[task_id]['message'] = '任务已停止'
-                    return
-            
-            # 从字幕文件名中提取标题
-            subtitle_filename = os.path.basename(subtitle_file)
-            subtitle_name = os.path.splitext(subtitle_filename)[0]
-            subtitle_title = subtitle_name.rsplit('_', 1)[0] if '_' in subtitle_name else subtitle_name
+            if task.check_stop():
+                return
             
             # 定义所有可能生成的文件路径
             summary_json_file = os.path.join(video_dir, f'{subtitle_title}_summary.json')
-            # markdown_dir = os.path.join(video_dir, 'markdown')
-            # full_content_file = os.path.join(markdown_dir, f'{subtitle_title}.md')
             # 根据用户需求，Markdown文件应直接存放在video_dir下
             full_content_file = os.path.join(video_dir, f'{subtitle_title}.md')
             exercises_file = os.path.join(video_dir, f'{subtitle_title}_exercises.json')
             questions_file = os.path.join(video_dir, f'{subtitle_title}_questions.json')
             
-            # 解析字幕（提前解析，供后续步骤使用）
-            subtitles = None
-            subtitle_text = None
-            plain_text = None
+            # 字幕解析结果在本文件的各步骤间共享，按需解析
+            subtitle_cache = _SubtitleCache(subtitle_file)
+            
+            # 收集需要生成的步骤：(步骤名, 输出文件, 生成函数)，四个步骤互不依赖，可并发调用LLM
+            progress_prefix = f'处理字幕 {file_index}/{total_files}: {subtitle_title}'
+            jobs = []
             
             # ========== 1. 生成要点总结 ==========
             if generate_options.get('summary', True):
-                if is_valid_summary(summary_json_file):
-                    with tasks_lock:
-                        tasks[task_id]['message'] = f'处理字幕 {file_index}/{total_files}: {subtitle_title} (1/4): 要点总结已存在，跳过'
+                if is_valid_summary(summary_json_file, existing_files):
+                    task.update(message=f'{progress_prefix} (1/4): 要点总结已存在，跳过')
+                elif summary_json_file in batched_summaries:
+                    pending_writes.append(_write_generation_result(summary_json_file,
+                                                                   batched_summaries[summary_json_file]))
+                    task.update(message=f'{progress_prefix} (1/4): 要点总结已批量生成')
                 else:
-                    with tasks_lock:
-                        tasks[task_id]['status'] = TaskStatus.SUMMARIZING
-                        tasks[task_id]['message'] = f'正在处理字幕 {file_index}/{total_files}: {subtitle_title} (1/4): 要点总结...'
-                        tasks[task_id]['subtitle_file'] = subtitle_file
-                    
-                    # 解析字幕
-                    if subtitles is None:
-                        subtitles = SRTParser.parse_srt_file(subtitle_file)
-                        subtitle_text = SRTParser.format_subtitles_for_llm(subtitles)
-                    
-                    summary = summarizer.summarize(subtitle_text, stream=False)
-                    
-                    with open(summary_json_file, 'w', encoding='utf-8') as f:
-                        json.dump(summary, f, ensure_ascii=False, indent=2)
+                    subtitle_text = subtitle_cache.subtitle_text
+                    jobs.append(('要点总结', summary_json_file,
+                                 partial(_cached_llm_call, model_key, 'summary', subtitle_text,
+                                         partial(_summarize_subtitle, summarizer, model_key, subtitle_text,
+                                                 _PartialOutput(task, 'partial_summary')),
+                                         _has_key_points)))
             else:
-                with tasks_lock:
-                     tasks[task_id]['message'] = f'处理字幕 {file_index}/{total_files}: {subtitle_title} (1/4): 要点总结 (用户选择跳过)'
-            
-            # 检查停止标志
-            with tasks_lock:
-                if tasks[task_id].get('stop_flag'):
-                    tasks[task_id]['status'] = TaskStatus.STOPPED
-                    tasks[task_id]['message'] = '任务已停止'
-                    return
+                task.update(message=f'{progress_prefix} (1/4): 要点总结 (用户选择跳过)')
             
             # ========== 2. 生成完整内容文档 ==========
             if generate_options.get('full_content', True):
-                if is_valid_content(full_content_file):
-                    with tasks_lock:
-                        tasks[task_id]['message'] = f'处理字幕 {file_index}/{total_files}: {subtitle_title} (2/4): 完整文档已存在，跳过'
+                if is_valid_content(full_content_file, existing_files):
+                    task.update(message=f'{progress_prefix} (2/4): 完整文档已存在，跳过')
                 else:
-                    with tasks_lock:
-                        tasks[task_id]['message'] = f'正在处理字幕 {file_index}/{total_files}: {subtitle_title} (2/4): 完整文档...'
-                    
-                    # 预处理字幕文本
-                    if plain_text is None:
-                        plain_text = SRTParser.extract_plain_text(subtitle_file)
-                    
-                    full_content = summarizer.generate_full_content(
-                        plain_text,
-                        video_title=video_title,
-                        stream=False
-                    )
-                    
-                    # 创建markdown子目录（如果不存在）
-                    # os.makedirs(markdown_dir, exist_ok=True)
-                    
-                    with open(full_content_file, 'w', encoding='utf-8') as f:
-                        f.write(full_content)
+                    jobs.append(('完整文档', full_content_file,
+                                 partial(_cached_llm_call, model_key, 'full_content',
+                                         f'{video_title}\n{subtitle_cache.plain_text}',
+                                         partial(_stream_full_content, summarizer, subtitle_cache.plain_text,
+                                                 video_title, full_content_file),
+                                         _has_content)))
             else:
-                with tasks_lock:
-                     tasks[task_id]['message'] = f'处理字幕 {file_index}/{total_files}: {subtitle_title} (2/4): 完整文档 (用户选择跳过)'
-            
-            # 检查停止标志
-            with tasks_lock:
-                if tasks[task_id].get('stop_flag'):
-                    tasks[task_id]['status'] = TaskStatus.STOPPED
-                    tasks[task_id]['message'] = '任务已停止'
-                    return
+                task.update(message=f'{progress_prefix} (2/4): 完整文档 (用户选择跳过)')
             
             # ========== 3. 生成练习题 ==========
             if generate_options.get('exercises', True):
-                if is_valid_exercises(exercises_file):
-                    with tasks_lock:
-                        tasks[task_id]['message'] = f'处理字幕 {file_index}/{total_files}: {subtitle_title} (3/4): 练习题已存在，跳过'
+                if is_valid_exercises(exercises_file, existing_files):
+                    task.update(message=f'{progress_prefix} (3/4): 练习题已存在，跳过')
                 else:
-                    with tasks_lock:
-                        tasks[task_id]['message'] = f'正在处理字幕 {file_index}/{total_files}: {subtitle_title} (3/4): 练习题...'
-                    
-                    # 预处理字幕文本（如果还没有）
-                    if plain_text is None:
-                        plain_text = SRTParser.extract_plain_text(subtitle_file)
-                    
-                    exercises = summarizer.generate_exercises(
-                        plain_text,
-                        video_title=video_title,
-                        stream=False
-                    )
-                    
-                    with open(exercises_file, 'w', encoding='utf-8') as f:
-                        json.dump(exercises, f, ensure_ascii=False, indent=2)
+                    jobs.append(('练习题', exercises_file,
+                                 partial(_cached_llm_call, model_key, 'exercises',
+                                         f'{video_title}\n{subtitle_cache.plain_text}',
+                                         partial(summarizer.generate_exercises, subtitle_cache.plain_text,
+                                                 video_title=video_title, stream=False),
+                                         summarizer.validate_exercises_format)))
             else:
-                with tasks_lock:
-                     tasks[task_id]['message'] = f'处理字幕 {file_index}/{total_files}: {subtitle_title} (3/4): 练习题 (用户选择跳过)'
-            
-            # 检查停止标志
-            with tasks_lock:
-                if tasks[task_id].get('stop_flag'):
-                    tasks[task_id]['status'] = TaskStatus.STOPPED
-                    tasks[task_id]['message'] = '任务已停止'
-                    return
+                task.update(message=f'{progress_prefix} (3/4): 练习题 (用户选择跳过)')
             
             # ========== 4. 生成预设问题 ==========
             if generate_options.get('questions', True):
-                if is_valid_questions(questions_file):
-                    with tasks_lock:
-                        tasks[task_id]['message'] = f'处理字幕 {file_index}/{total_files}: {subtitle_title} (4/4): 预设问题已存在，跳过'
+                if is_valid_questions(questions_file, existing_files):
+                    task.update(message=f'{progress_prefix} (4/4): 预设问题已存在，跳过')
                 else:
-                    with tasks_lock:
-                        tasks[task_id]['message'] = f'正在处理字幕 {file_index}/{total_files}: {subtitle_title} (4/4): 预设问题...'
-                    
-                    # 预处理字幕文本（如果还没有）
-                    if plain_text is None:
-                        plain_text = SRTParser.extract_plain_text(subtitle_file)
-                    
-                    preset_questions = summarizer.generate_preset_questions(
-                        plain_text,
-                        video_title=video_title,
-                        stream=False
-                    )
-                    
-                    with open(questions_file, 'w', encoding='utf-8') as f:
-                        json.dump(preset_questions, f, ensure_ascii=False, indent=2)
+                    jobs.append(('预设问题', questions_file,
+                                 partial(_cached_llm_call, model_key, 'questions',
+                                         f'{video_title}\n{subtitle_cache.plain_text}',
+                                         partial(summarizer.generate_preset_questions, subtitle_cache.plain_text,
+                                                 video_title=video_title, stream=False),
+                                         _has_questions)))
             else:
-                with tasks_lock:
-                     tasks[task_id]['message'] = f'处理字幕 {file_index}/{total_files}: {subtitle_title} (4/4): 预设问题 (用户选择跳过)'
+                task.update(message=f'{progress_prefix} (4/4): 预设问题 (用户选择跳过)')
+            
+            if jobs:
+                task.update(
+                    status=TaskStatus.SUMMARIZING,
+                    message=f'正在{progress_prefix}: 并行生成 {"、".join(job[0] for job in jobs)}...',
+                    subtitle_file=subtitle_file
+                )
+                if not _run_generation_jobs(task, jobs, progress_prefix, pending_writes):
+                    task.check_stop()
+                    return
+                # 总结已写入文件，清掉生成过程中的部分内容，避免轮询响应一直带着它
+                task.update(partial_summary=None)
             
             # 记录本字幕生成的所有文件
             all_generated_files.append({
@@ -716,30 +1735,16 @@ def process_video_task(task_id, thread_name, url, output_dir, model_name, cookie
                 'exercises': exercises_file,
                 'questions': questions_file
             })
-        # 5. 将生成的数据写入 JSON
-        with tasks_lock:
-            tasks[task_id]['message'] = f'正在写入Section数据: {video_title}...'
-        
-        save_sections_to_json(video_dir, url, all_generated_files)
+        # 生成结果全部落盘后才能汇总为 Section 数据
+        for pending in pending_writes:
+            pending.wait()
         
-
-        # 更新任务状态为完成
-        with tasks_lock:
-            tasks[task_id]['status'] = TaskStatus.COMPLETED
-            tasks[task_id]['message'] = f'全部完成！已处理 {total_files} 个字幕文件，生成了字幕、封面、总结、完整文档、练习题和预设问题'
-            tasks[task_id]['files'] = {
-                'video_dir': video_dir,
-                'cover': cover_path,
-                'generated_files': all_generated_files
-            }
-            tasks[task_id]['completed_at'] = datetime.now().isoformat()
+        # 5. 将生成的数据写入 JSON（交给后处理线程，工作线程可以立即处理下一个任务）
+        _finish_task(task, url, output_dir, download_all_parts, video_title, video_dir, cover_path, all_generated_files)
         
     except Exception as e:
         # 更新状态：失败
-        with tasks_lock:
-            tasks[task_id]['status'] = TaskStatus.FAILED
-            tasks[task_id]['message'] = f'错误: {str(e)}'
-            tasks[task_id]['error'] = str(e)
+        task.update(status=TaskStatus.FAILED, message=f'错误: {str(e)}', error=str(e))
 
 
 
@@ -756,11 +1761,8 @@ def index():
 def get_models():
     """获取模型列表"""
     try:
-        models = load_models()
-        return jsonify({
-            'success': True,
-            'models': models
-        })
+        return _etag_json_response(_file_etag('config/llm_models.json'),
+                                   lambda: {'success': True, 'models': load_models()})
     except Exception as e:
         return jsonify({
             'success': False,
@@ -775,7 +1777,7 @@ def add_model():
         data = request.json
         
         # 生成唯一ID
-        model_id = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        model_id = _new_id()
         
         new_model = {
             'id': model_id,
@@ -784,9 +1786,11 @@ def add_model():
             'api_base': data.get('api_base'),
             'api_key': data.get('api_key')
         }
+        if data.get('max_parallel'):
+            new_model['max_parallel'] = int(data['max_parallel'])
         
-        models = load_models()
-        models.append(new_model)
+        models = load_models_dict()
+        models[model_id] = new_model
         save_models(models)
         
         return jsonify({
@@ -805,17 +1809,17 @@ def update_model(model_id):
     """更新模型"""
     try:
         data = request.json
-        models = load_models()
-        
-        for model in models:
-            if model['id'] == model_id:
-                model['name'] = data.get('name', model['name'])
-                model['model_name'] = data.get('model_name', model['model_name'])
-                model['api_base'] = data.get('api_base', model['api_base'])
-                model['api_key'] = data.get('api_key', model['api_key'])
-                break
-        
-        save_models(models)
+        models = load_models_dict()
+        
+        model = models.get(model_id)
+        if model is not None:
+            model['name'] = data.get('name', model['name'])
+            model['model_name'] = data.get('model_name', model['model_name'])
+            model['api_base'] = data.get('api_base', model['api_base'])
+            model['api_key'] = data.get('api_key', model['api_key'])
+            if data.get('max_parallel'):
+                model['max_parallel'] = int(data['max_parallel'])
+            save_models(models)
         
         return jsonify({
             'success': True
@@ -831,9 +1835,9 @@ def update_model(model_id):
 def delete_model(model_id):
     """删除模型"""
     try:
-        models = load_models()
-        models = [m for m in models if m['id'] != model_id]
-        save_models(models)
+        models = load_models_dict()
+        if models.pop(model_id, None) is not None:
+            save_models(models)
         
         return jsonify({
             'success': True
@@ -863,6 +1867,12 @@ def create_workspace():
                 'success': False,
                 'error': '工作区路径不能为空'
             }), 400
+
+        if not is_safe_dir(path):
+            return jsonify({
+                'success': False,
+                'error': '工作区路径包含不允许的字符'
+            }), 400
         
         # 加载现有工作区
         workspaces = load_workspaces()
@@ -898,8 +1908,7 @@ def create_workspace():
         try:
             course_data = create_empty_course(title=name)
             course_file_path = os.path.join(full_path, 'course.json')
-            with open(course_file_path, 'w', encoding='utf-8') as f:
-                json.dump(course_data, f, ensure_ascii=False, indent=2)
+            _atomic_write_json(course_file_path, course_data)
         except Exception as e:
             # 如果创建 course.json 失败，清理已创建的文件夹
             try:
@@ -1013,7 +2022,7 @@ def get_cookies_config():
                 'has_value': False  # 表示是否有配置值
             })
         
-        cookies = load_cookies_from_file(cookies_file)
+        cookies = load_cookies(cookies_file)
         has_sessdata = bool(cookies.get('sessdata'))
         
         return jsonify({
@@ -1041,8 +2050,7 @@ def update_cookies_config():
             })
 
         # 写入cookies.txt文件
-        with open('cookies.txt', 'w', encoding='utf-8') as f:
-            f.write(f'SESSDATA={sessdata}\n')
+        _atomic_write_text('cookies.txt', f'SESSDATA={sessdata}\n')
         
         return jsonify({
             'success': True,
@@ -1071,7 +2079,7 @@ def test_cookies():
                     'error': 'Cookie配置文件不存在'
                 })
             
-            cookies = load_cookies_from_file(cookies_file)
+            cookies = load_cookies(cookies_file)
             sessdata = cookies.get('sessdata', '')
         
         if not sessdata:
@@ -1080,12 +2088,7 @@ def test_cookies():
                 'error': 'SESSDATA不能为空'
             })
 
-        # 创建临时下载器实例进行测试
-        from bilibili_subtitle_downloader import BilibiliSubtitleDownloader
-        downloader = BilibiliSubtitleDownloader(sessdata=sessdata)
-        
-        # 尝试访问一个公开可用的API来测试Cookie有效性
-        import requests
+        # 尝试访问一个公开可用的API来测试Cookie有效性（复用共享会话的连接）
         test_headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Referer': 'https://www.bilibili.com/',
@@ -1093,11 +2096,11 @@ def test_cookies():
         }
         
         # 尝试获取用户信息来验证Cookie
-        resp = requests.get('https://api.bilibili.com/x/web-interface/nav', 
-                           headers=test_headers, timeout=10)
+        resp = _bili_session.get('https://api.bilibili.com/x/web-interface/nav',
+                                 headers=test_headers, timeout=10)
         
         if resp.status_code == 200:
-            result = resp.json()
+            result = _json_loads(resp.content)
             if result.get('code') == 0:  # 成功
                 uname = result.get('data', {}).get('uname', '未知用户')
                 return jsonify({
@@ -1124,9 +2127,6 @@ def test_cookies():
 def create_tasks():
     """创建批量任务"""
     try:
-        # 确保工作线程已启动
-        start_worker_threads()
-        
         data = request.json
         urls = data.get('urls', [])
         workspace_name = data.get('workspace_name')
@@ -1141,6 +2141,14 @@ def create_tasks():
                 'success': False,
                 'error': '工作区不存在'
             }), 400
+
+        # 工作区配置文件可能被手动修改，创建目录前再次校验
+        if not is_safe_dir(output_dir):
+            return jsonify({
+                'success': False,
+                'error': '工作区路径无效'
+            }), 400
+        output_dir = os.path.realpath(output_dir)
             
         model_name = data.get('model_name')
         cookies_file = data.get('cookies_file', 'cookies.txt')
@@ -1176,8 +2184,8 @@ def create_tasks():
         # 创建输出目录
         os.makedirs(output_dir, exist_ok=True)
         
-        # 加载Cookie用于检测收藏夹
-        config_cookies = load_cookies_from_file(cookies_file)
+        # 下载器只在遇到收藏夹URL时创建一次，用于获取收藏夹视频列表
+        downloader = None
         
         # 处理URL列表，展开收藏夹URL
         expanded_urls = []
@@ -1187,19 +2195,13 @@ def create_tasks():
                 continue
             
             # 检查是否为收藏夹URL
-            downloader = BilibiliSubtitleDownloader(
-                sessdata=config_cookies.get('sessdata'),
-                bili_jct=config_cookies.get('bili_jct'),
-                buvid3=config_cookies.get('buvid3'),
-                debug=False,
-                ffmpeg_path=ffmpeg_path
-            )
-            
-            if downloader.is_favorite_url(url):
+            if is_favorite_url(url):
                 # 获取收藏夹ID
-                fid = downloader.extract_fid(url)
+                fid = extract_fid(url)
                 if fid:
                     print(f"检测到收藏夹URL，正在获取视频列表...")
+                    if downloader is None:
+                        downloader = get_downloader(cookies_file, ffmpeg_path)
                     # 获取收藏夹内的视频列表
                     videos = downloader.get_favorite_videos(fid)
                     for video in videos:
@@ -1221,21 +2223,15 @@ def create_tasks():
             }), 400
         
         # 创建任务并加入队列
-        task_ids = []
-        for index, url in enumerate(expanded_urls):
-            task_id = str(uuid.uuid4())
-            
-            with tasks_lock:
-                tasks[task_id] = {
-                    'id': task_id,
-                    'url': url,
-                    'status': TaskStatus.PENDING,
-                    'message': '等待队列处理（避免并发过高）',
-                    'created_at': datetime.now().isoformat()
-                }
+        new_tasks = []
+        batch = []
+        created_at = datetime.now().isoformat()  # 同一批任务共用创建时间
+        for url in expanded_urls:
+            task_id = _new_id()
+            new_tasks.append(Task(task_id, url, '等待队列处理（避免并发过高）', created_at))
             
             # 将任务放入队列，而不是直接启动线程
-            task_data = {
+            batch.append({
                 'task_id': task_id,
                 'url': url,
                 'output_dir': output_dir,
@@ -1244,13 +2240,23 @@ def create_tasks():
                 'download_all_parts': download_all_parts,
                 'generate_options': generate_options,
                 'ffmpeg_path': ffmpeg_path
-            }
-            task_queue.put(task_data)
-            
-            task_ids.append(task_id)
+            })
+        
+        # 先登记全部任务，再一次性入队（工作线程取到任务时任务必须已登记）
+        _add_tasks(new_tasks)
+        try:
+            _enqueue_batch(task_queue, batch)
+        except Full:
+            _remove_tasks(task.id for task in new_tasks)
+            return jsonify({
+                'success': False,
+                'error': f'队列已满（最多排队 {TASK_QUEUE_MAXSIZE} 个任务），请等待当前任务处理后再提交'
+            }), 429
+        for task in new_tasks:
+            _publish_task_event(task)
+        task_ids = [task.id for task in new_tasks]
         
-        # 获取当前配置的并发数
-        config = load_app_config() 
+        # 获取当前配置的并发数（沿用前面已加载的配置）
         max_concurrent = config.get('max_concurrent_tasks', MAX_CONCURRENT_TASKS)
         
         return jsonify({
@@ -1270,53 +2276,167 @@ def create_tasks():
 @app.route('/api/tasks/<task_id>', methods=['GET'])
 def get_task_status(task_id):
     """获取任务状态"""
-    with tasks_lock:
-        task = tasks.get(task_id)
-        if not task:
-            return jsonify({
-                'success': False,
-                'error': '任务不存在'
-            }), 404
-        
+    task = tasks.get(task_id)
+    if not task:
         return jsonify({
-            'success': True,
-            'task': task
-        })
+            'success': False,
+            'error': '任务不存在'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'task': task.to_dict()
+    })
+
+
+# /api/tasks?compact=1 返回的字段
+TASK_COMPACT_FIELDS = ('id', 'url', 'status', 'message', 'created_at', 'version', 'video_title')
 
 
 @app.route('/api/tasks', methods=['GET'])
 def get_all_tasks():
-    """获取所有任务"""
-    with tasks_lock:
+    """
+    获取所有任务
+    
+    响应带有 ETag（任务版本号），客户端携带 If-None-Match 且没有任何变化时返回 304；
+    传入 since=<版本号> 时只返回该版本之后有变化的任务，removed 为该版本之后被移除的任务ID
+    （只保留最近 REMOVED_TASKS_HISTORY 条移除记录，落后太多的客户端应重新获取完整列表）。
+    列表默认不含流式生成中的 partial_summary（体积大，需要时请求单个任务）；
+    传入 compact=1 时只返回 TASK_COMPACT_FIELDS 中的字段。
+    """
+    # 先取版本号再取快照：快照只会比版本号更新，不会漏掉变化
+    version = tasks_version
+    queue_size = task_queue.qsize()
+    etag = f'"{version}-{queue_size}"'
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+    
+    since = request.args.get('since', type=int)
+    # tasks 为写时复制字典，直接遍历当前引用即可
+    task_list = list(tasks.values())
+    removed = None
+    if since is not None:
+        task_list = [task for task in task_list if task.version > since]
+        removed = [task_id for removed_version, task_id in list(removed_tasks) if removed_version > since]
+    
+    if request.args.get('compact'):
+        task_dicts = [{key: data.get(key) for key in TASK_COMPACT_FIELDS}
+                      for data in (task.to_dict() for task in task_list)]
+    else:
+        task_dicts = [task.to_dict() for task in task_list]
+        for data in task_dicts:
+            data.pop('partial_summary', None)
+    
+    payload = {
+        'success': True,
+        'tasks': task_dicts,
+        'queue_size': queue_size,
+        'version': version
+    }
+    if removed is not None:
+        payload['removed'] = removed
+    response = jsonify(payload)
+    response.headers['ETag'] = etag
+    # 浏览器每次都带 ETag 重新验证，未变化时直接复用缓存的响应体
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _sse_task_response(task_id=None):
+    """
+    创建推送任务事件的 SSE 响应
+    
+    Args:
+        task_id: 只推送该任务的事件；None 表示推送所有任务
+    """
+    def generate():
+        # 先订阅再取快照，保证两者之间发生的更新不会丢失
+        subscriber = Queue(maxsize=1000)
+        with task_subscribers_lock:
+            task_subscribers[subscriber] = task_id
+        try:
+            current = tasks
+            if task_id is None:
+                task_list = list(current.values())
+            else:
+                task_list = [current[task_id]] if task_id in current else []
+            for task in task_list:
+                data = task.to_dict()
+                if task_id is None:
+                    data.pop('partial_summary', None)
+                yield f"event: task\ndata: {_json_dumps(data)}\n\n"
+            while True:
+                try:
+                    yield subscriber.get(timeout=SSE_HEARTBEAT_INTERVAL)
+                except Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            with task_subscribers_lock:
+                task_subscribers.pop(subscriber, None)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@app.route('/api/tasks/stream', methods=['GET'])
+def stream_tasks():
+    """
+    以 Server-Sent Events 推送任务状态变化
+    
+    连接建立后先推送所有任务的当前状态，之后每次任务更新推送一条 task 事件，
+    可替代对 /api/tasks 的定时轮询。
+    """
+    return _sse_task_response()
+
+
+@app.route('/api/tasks/<task_id>/stream', methods=['GET'])
+def stream_task(task_id):
+    """以 Server-Sent Events 推送单个任务的状态变化（包括生成中的 partial_summary）"""
+    if task_id not in tasks:
         return jsonify({
-            'success': True,
-            'tasks': list(tasks.values())
-        })
+            'success': False,
+            'error': '任务不存在'
+        }), 404
+    return _sse_task_response(task_id)
+
+
+@app.route('/api/tasks/purge', methods=['POST'])
+def purge_tasks():
+    """从任务列表中清除所有已结束（完成、失败、停止）的任务"""
+    removed = evict_finished_tasks(ttl=0)
+    return jsonify({
+        'success': True,
+        'removed': removed
+    })
 
 
 @app.route('/api/tasks/<task_id>/stop', methods=['POST'])
 def stop_task(task_id):
     """停止任务"""
     try:
-        with tasks_lock:
-            task = tasks.get(task_id)
-            if not task:
-                return jsonify({
-                    'success': False,
-                    'error': '任务不存在'
-                }), 404
-            
+        task = tasks.get(task_id)
+        if not task:
+            return jsonify({
+                'success': False,
+                'error': '任务不存在'
+            }), 404
+        
+        with task.lock:
             # 如果任务已经完成、失败或停止，则不能再停止
-            if task['status'] in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.STOPPED]:
+            if task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.STOPPED]:
                 return jsonify({
                     'success': False,
-                    'error': f'任务已经是{task["status"]}状态，无法停止'
+                    'error': f'任务已经是{task.status}状态，无法停止'
                 }), 400
             
             # 设置停止标志和更新状态
-            task['stop_flag'] = True
-            task['status'] = TaskStatus.STOPPING
-            task['message'] = '正在停止任务，请等待当前步骤完成...'
+            task.stop_event.set()
+            task.status = TaskStatus.STOPPING
+            task.message = '正在停止任务，请等待当前步骤完成...'
+            task.version = _next_tasks_version()
+        _publish_task_event(task)
         
         return jsonify({
             'success': True,
@@ -1329,15 +2449,68 @@ def stop_task(task_id):
         }), 500
 
 
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """获取LLM响应缓存的命中统计"""
+    return jsonify({
+        'success': True,
+        'stats': llm_cache.stats()
+    })
+
+
+# 可通过 /api/tasks/<task_id>/files/<kind> 下载的生成文件类型（all_generated_files 中的字段）
+DOWNLOADABLE_FILE_KINDS = frozenset({'subtitle_file', 'summary', 'content_md', 'exercises', 'questions'})
+
+
+@app.route('/api/tasks/<task_id>/files/<kind>', methods=['GET'])
+def download_task_file(task_id, kind):
+    """
+    下载已完成任务的生成文件
+    
+    kind 为 cover 或 DOWNLOADABLE_FILE_KINDS 之一；分P视频用 ?index=<序号> 指定第几个字幕（默认0）。
+    文件由 send_from_directory 直接发送（支持条件请求和 Range），任务完成后文件不再变化，允许浏览器缓存。
+    """
+    task = tasks.get(task_id)
+    if not task or task.status != TaskStatus.COMPLETED:
+        return jsonify({'success': False, 'error': '任务不存在或尚未完成'}), 404
+    
+    files = task.details.get('files') or {}
+    video_dir = files.get('video_dir')
+    if kind == 'cover':
+        filepath = files.get('cover')
+    elif kind in DOWNLOADABLE_FILE_KINDS:
+        index = request.args.get('index', 0, type=int)
+        generated_files = files.get('generated_files') or []
+        filepath = generated_files[index].get(kind) if 0 <= index < len(generated_files) else None
+    else:
+        return jsonify({'success': False, 'error': f'不支持的文件类型: {kind}'}), 400
+    
+    if not filepath or not video_dir or not os.path.isfile(filepath):
+        return jsonify({'success': False, 'error': '文件不存在'}), 404
+    # 只允许发送任务输出目录内的文件
+    real_dir = os.path.realpath(video_dir)
+    real_path = os.path.realpath(filepath)
+    try:
+        inside = os.path.commonpath([real_dir, real_path]) == real_dir
+    except ValueError:  # Windows 下不在同一盘符
+        inside = False
+    if not inside:
+        return jsonify({'success': False, 'error': '文件路径无效'}), 403
+    
+    response = send_from_directory(os.path.dirname(real_path), os.path.basename(real_path),
+                                   conditional=True, max_age=3600)
+    response.cache_control.public = True
+    return response
+
+
 @app.route('/api/config', methods=['GET'])
 def get_app_config():
     """获取应用配置"""
     try:
+        # 先确保配置文件存在（不存在时 load_app_config 会写入默认配置），再按文件签名计算 ETag
         config = load_app_config()
-        return jsonify({
-            'success': True,
-            'config': config
-        })
+        return _etag_json_response(_file_etag('config/app_config.json'),
+                                   lambda: {'success': True, 'config': config})
     except Exception as e:
         return jsonify({
             'success': False,
@@ -1496,8 +2669,7 @@ def save_course(workspace_name):
         
         # 保存course.json文件（覆盖原有文件）
         course_file = os.path.join(workspace_path, 'course.json')
-        with open(course_file, 'w', encoding='utf-8') as f:
-            json.dump(course_data, f, ensure_ascii=False, indent=2)
+        _atomic_write_json(course_file, course_data)
         
         return jsonify({
             'success': True,
@@ -1583,6 +2755,44 @@ def leading_questions_search_by_section_proxy():
 def ai_personas_get_by_id_proxy():
     return _proxy_post_to_courses_api('/api/ai-personas/getById')
 
+def is_debug_enabled(config=None):
+    """
+    是否启用 Flask 调试模式：环境变量 FLASK_DEBUG=1 或配置项 debug 为 true
+    
+    调试模式会改用开发服务器并开启调试器，仅用于本地开发。
+    """
+    if os.environ.get('FLASK_DEBUG', '0') == '1':
+        return True
+    if config is None:
+        config = load_app_config()
+    return bool(config.get('debug', False))
+
+
+def run_server(port, debug=False):
+    """
+    启动Web服务
+    
+    安装了 waitress 时使用它作为WSGI服务器（多线程处理请求，适合前端频繁轮询），
+    否则退回 Flask 自带的开发服务器。
+    
+    Args:
+        port: 监听端口
+        debug: 是否使用 Flask 调试模式（仅开发服务器支持）
+    """
+    # 服务启动前先拉起工作线程，首个任务提交时无需再创建线程
+    start_worker_threads()
+    
+    if waitress_serve is not None and not debug:
+        # 每个 SSE 连接会一直占用一个请求线程，打开多个任务推送页面时需相应调大 web_threads
+        threads = max(1, int(load_app_config().get('web_threads', WEB_SERVER_THREADS)))
+        print(f"使用 waitress 提供服务（{threads} 个请求线程）")
+        waitress_serve(app, host='0.0.0.0', port=port, threads=threads, ident=None)
+        return
+    
+    # 使用 use_reloader=False 避免Flask重新加载导致工作线程丢失
+    app.run(host='0.0.0.0', port=port, debug=debug, use_reloader=False, threaded=True)
+
+
 @app.route('/shutdown', methods=['GET'])
 def shutdown():
     # 可以在这里执行一些清理工作
@@ -1611,15 +2821,12 @@ if __name__ == '__main__':
     print("服务启动中...")
     print(f"访问地址: http://127.0.0.1:{port}")
     print(f"最大并发任务数: {max_concurrent}")
-    print(f"工作线程将在首次创建任务时启动")
     print()
     print("按 Ctrl+C 停止服务")
     print("=" * 80)
     print()
     
-    # 使用 use_reloader=False 避免Flask重新加载导致工作线程丢失
-    # 使用 debug=False 在生产环境中，或者确保工作线程在每次重载后都能正确启动
-    app.run(host='0.0.0.0', port=port, debug=True, use_reloader=False, threaded=True)
+    run_server(port, debug=is_debug_enabled(config))
 
 
 
@@ -6,22 +6,195 @@ Bilibili视频字幕下载器
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import re
 import os
 import sys
 import time
+import uuid
+import subprocess
+import traceback
 import random
+import threading
 import hashlib
+import copy
+from collections import OrderedDict
 import urllib.parse
+import http.cookiejar
 from typing import Optional, Dict, List
 import argparse
 from pathlib import Path
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
 import process_video_info
 try:
     import video_transcriber
 except ImportError:
     video_transcriber = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_loads(content: bytes):
+    """解析API响应体（安装了 orjson 时直接解析字节，跳过 requests 的编码探测）"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def _write_json_file(obj, output_path: str, indent: bool = True) -> None:
+    """把对象写为UTF-8 JSON文件，indent为False时写成紧凑格式（安装了 orjson 时用它序列化）"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(obj, option=option))
+    else:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            if indent:
+                json.dump(obj, f, ensure_ascii=False, indent=2)
+            else:
+                json.dump(obj, f, ensure_ascii=False, separators=(',', ':'))
+
+
+# 每个 Session 的连接池大小
+HTTP_POOL_SIZE = 32
+
+# 多分P视频并行查询字幕信息的最大线程数
+SUBTITLE_FETCH_WORKERS = 4
+
+# 并行请求收藏夹分页的最大线程数
+FAVORITE_FETCH_WORKERS = 4
+
+# 一次取出字幕条目的开始时间、结束时间和内容
+_cue_fields = itemgetter('from', 'to', 'content')
+
+# 每个下载器实例缓存的视频信息/字幕信息条数，及缓存有效期（秒）
+VIDEO_INFO_CACHE_SIZE = 256
+VIDEO_INFO_CACHE_TTL = 300
+
+# 值得重试的HTTP状态码（412为B站风控拦截，其余为限流及服务端临时错误）
+RETRYABLE_STATUS_CODES = frozenset((412, 429, 500, 502, 503, 504))
+# 重试退避的最长等待（秒，不含随机抖动）
+MAX_RETRY_BACKOFF = 8
+
+
+class _ResponseCache:
+    """线程安全的小型LRU缓存，条目超过有效期后失效；取出的是副本，调用方可随意修改"""
+
+    def __init__(self, max_size: int = VIDEO_INFO_CACHE_SIZE, ttl: float = VIDEO_INFO_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """取出未过期的缓存副本，没有时返回None"""
+        with self._lock:
+            cached = self._items.get(key)
+            if cached is None:
+                return None
+            if time.time() - cached[0] >= self.ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            value = cached[1]
+        return copy.deepcopy(value)
+
+    def put(self, key, value) -> None:
+        """保存一份副本，超出条数上限时丢弃最久未用的条目"""
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._items[key] = (time.time(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+def _is_retryable_error(exc: Exception) -> bool:
+    """判断请求异常是否为临时性错误（连接失败、超时、限流或服务端错误），其余错误重试也不会成功"""
+    if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(exc, requests.exceptions.HTTPError):
+        return exc.response is not None and exc.response.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def _retry_backoff(attempt: int) -> float:
+    """第 attempt 次（从0开始）失败后的等待秒数：指数退避加随机抖动，避免多个线程同时重试"""
+    return min(2 ** attempt, MAX_RETRY_BACKOFF) + random.uniform(0, 1)
+
+
+def create_session() -> requests.Session:
+    """
+    创建用于访问B站的 HTTP 会话（keep-alive 连接池，多次请求复用 TCP/TLS 连接）
+    
+    Cookie 由每次请求显式传入，会话本身不保存服务器下发的 Cookie，
+    因此同一会话可以在使用不同账号 Cookie 的下载器之间共享。
+    
+    建连失败（请求尚未到达服务器）由连接池立即重试，不消耗下载器的重试次数；
+    读超时、HTTP 状态码和API错误码仍由各下载方法经过限速后自行重试。
+    
+    Returns:
+        requests.Session 实例
+    """
+    session = requests.Session()
+    retry = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2,
+                  allowed_methods=frozenset(['GET']), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+# 收藏夹ID，格式: https://space.bilibili.com/UID/favlist?fid=FAVID
+_FID_RE = re.compile(r'fid=(\d+)', re.A)
+
+# Wbi签名：混合密钥的字符重排表，以及签名前要从参数值中去掉的字符
+_WBI_MIXIN_KEY_ENC_TAB = (
+    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49, 33, 9, 42, 19, 29, 28, 14, 39, 12,
+    38, 41, 13, 37, 48, 7, 16, 24, 55, 40, 61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62,
+    11, 36, 20, 34, 44, 52,
+)
+_WBI_STRIP_TABLE = str.maketrans('', '', "!'()*")
+
+# 视频BV号及URL中的分P参数（?p=2 或 &p=2）
+_BVID_RE = re.compile(r'BV[a-zA-Z0-9]+')
+_PAGE_RE = re.compile(r'[?&]p=(\d+)')
+
+
+def is_favorite_url(url: str) -> bool:
+    """
+    判断URL是否为收藏夹URL
+    
+    Args:
+        url: URL字符串
+        
+    Returns:
+        是否为收藏夹URL
+    """
+    # 更严格的判断：必须包含 favlist 且有 fid= 参数
+    return 'favlist' in url and 'fid=' in url
+
+
+def extract_fid(url: str) -> Optional[str]:
+    """
+    从收藏夹URL中提取收藏夹ID
+    
+    Args:
+        url: Bilibili收藏夹URL
+        
+    Returns:
+        收藏夹ID，如果提取失败返回None
+    """
+    match = _FID_RE.search(url)
+    if match:
+        return match.group(1)
+    return None
 
 
 class BilibiliSubtitleDownloader:
@@ -29,7 +202,9 @@ class BilibiliSubtitleDownloader:
     
     def __init__(self, sessdata: Optional[str] = None, bili_jct: Optional[str] = None, 
                  buvid3: Optional[str] = None, debug: bool = False,
-                 request_delay: float = 2.0, max_retries: int = 3, ffmpeg_path: Optional[str] = None):
+                 request_delay: float = 2.0, max_retries: int = 3, ffmpeg_path: Optional[str] = None,
+                 session: Optional[requests.Session] = None, pretty_json: bool = False,
+                 request_burst: int = 5):
         """
         初始化下载器
         
@@ -38,9 +213,12 @@ class BilibiliSubtitleDownloader:
             bili_jct: B站登录Cookie中的bili_jct
             buvid3: B站登录Cookie中的buvid3
             debug: 是否开启调试模式
-            request_delay: 请求间隔（秒）
+            request_delay: 平均请求间隔（秒）
             max_retries: 最大重试次数
             ffmpeg_path: FFmpeg可执行文件路径（可选，为空时使用系统PATH中的ffmpeg）
+            session: 共享的HTTP会话（可选，为空时创建新会话，见 create_session）
+            pretty_json: JSON格式字幕是否带缩进（默认False，写成紧凑格式）
+            request_burst: 空闲后允许不等待连续发出的请求数，之后按 request_delay 的平均间隔限速
         """
         self.sessdata = sessdata
         self.bili_jct = bili_jct
@@ -49,6 +227,10 @@ class BilibiliSubtitleDownloader:
         self.request_delay = request_delay
         self.max_retries = max_retries
         self.ffmpeg_path = ffmpeg_path
+        self.pretty_json = pretty_json
+        # 只关闭自己创建的会话，外部传入的共享会话由调用方管理
+        self._owns_session = session is None
+        self.session = session or create_session()
         
         # 使用更真实的浏览器User-Agent
         user_agents = [
@@ -81,17 +263,38 @@ class BilibiliSubtitleDownloader:
 
         self.wbi_img_key = None
         self.wbi_sub_key = None
-        self.last_request_time = 0
+        # 令牌桶限速：每 request_delay 秒补充一个令牌，最多攒 request_burst 个
+        self.request_burst = max(1, request_burst)
+        self._tokens = float(self.request_burst)
+        self._last_refill = time.time()
+        # 多个任务线程可共用同一实例，请求间隔的计算需要加锁
+        self._request_lock = threading.Lock()
+        # 最近一次成功返回字幕的API名称（见 get_subtitle_info）
+        self._preferred_subtitle_api = None
+        # 同一视频的多个分P或重试任务不再重复请求（见 get_video_info、get_subtitle_info）
+        self._video_info_cache = _ResponseCache()
+        self._subtitle_info_cache = _ResponseCache()
         
         # 初始化Wbi密钥
         self._get_wbi_keys()
 
+    def close(self):
+        """释放自己创建的HTTP会话及其连接"""
+        if self._owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def _get_wbi_keys(self):
         """获取最新的Wbi密钥"""
         try:
-            resp = requests.get('https://api.bilibili.com/x/web-interface/nav', headers=self.headers, cookies=self.cookies)
+            resp = self.session.get('https://api.bilibili.com/x/web-interface/nav', headers=self.headers, cookies=self.cookies)
             resp.raise_for_status()
-            json_content = resp.json()
+            json_content = _json_loads(resp.content)
             wbi_img = json_content['data']['wbi_img']
             self.wbi_img_key = wbi_img['img_url'].split("/")[-1].split(".")[0]
             self.wbi_sub_key = wbi_img['sub_url'].split("/")[-1].split(".")[0]
@@ -103,42 +306,47 @@ class BilibiliSubtitleDownloader:
             # 使用默认/后备密钥，虽然可能无效但防止程序直接崩溃
             self.wbi_img_key = "7cd084941338484aae1ad9425b84077c" 
             self.wbi_sub_key = "4932caff0a9246c7a592540e2310d958"
+        # 混合密钥只随Wbi密钥变化，算好后供每次签名直接使用
+        self._mixin_key = self._get_mixin_key(self.wbi_img_key + self.wbi_sub_key)
 
     def _get_mixin_key(self, ae):
         """混合密钥生成"""
-        oe = [46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49, 33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40, 61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11, 36, 20, 34, 44, 52]
-        le = []
-        for n in oe:
-            if n < len(ae):
-                le.append(ae[n])
-        return "".join(le)[:32]
+        return "".join(ae[n] for n in _WBI_MIXIN_KEY_ENC_TAB if n < len(ae))[:32]
 
     def _enc_wbi(self, params: dict):
         """为参数添加Wbi签名"""
-        mixin_key = self._get_mixin_key(self.wbi_img_key + self.wbi_sub_key)
+        mixin_key = self._mixin_key
         curr_time = round(time.time())
         params['wts'] = curr_time
         params = dict(sorted(params.items()))
         # 过滤不用签名的字符
-        params = {
-            k: ''.join(filter(lambda chr: chr not in "!'()*", str(v)))
-            for k, v in params.items()
-        }
+        params = {k: str(v).translate(_WBI_STRIP_TABLE) for k, v in params.items()}
         query = urllib.parse.urlencode(params)
         wbi_sign = hashlib.md5((query + mixin_key).encode()).hexdigest()
         params['w_rid'] = wbi_sign
         return params
 
     def _wait_if_needed(self):
-        """在请求前等待，避免请求过快"""
-        if self.last_request_time > 0:
-            elapsed = time.time() - self.last_request_time
-            if elapsed < self.request_delay:
-                wait_time = self.request_delay - elapsed + random.uniform(0, 0.5)  # 添加随机延迟
-                if self.debug:
-                    print(f"[DEBUG] 等待 {wait_time:.2f} 秒...")
-                time.sleep(wait_time)
-        self.last_request_time = time.time()
+        """
+        在请求前等待，避免请求过快（令牌桶：空闲后的少量请求直接发出，持续请求按 request_delay 平均限速，
+        多线程共用实例时各请求依次错开）
+        """
+        if self.request_delay <= 0:
+            return
+        with self._request_lock:
+            now = time.time()
+            rate = 1.0 / self.request_delay
+            self._tokens = min(self.request_burst, self._tokens + (now - self._last_refill) * rate)
+            self._last_refill = now
+            # 先扣下本次请求的令牌（不足时记为欠账），在锁外等待，不阻塞其他线程计算各自的等待时间
+            self._tokens -= 1
+            wait_time = 0
+            if self._tokens < 0:
+                wait_time = -self._tokens / rate + random.uniform(0, 0.5)  # 添加随机延迟
+        if wait_time > 0:
+            if self.debug:
+                print(f"[DEBUG] 等待 {wait_time:.2f} 秒...")
+            time.sleep(wait_time)
     
     def extract_bvid(self, url: str) -> Optional[str]:
         """
@@ -150,9 +358,7 @@ class BilibiliSubtitleDownloader:
         Returns:
             BV号，如果提取失败返回None
         """
-        # 匹配BV号的正则表达式
-        pattern = r'BV[a-zA-Z0-9]+'
-        match = re.search(pattern, url)
+        match = _BVID_RE.search(url)
         
         if match:
             return match.group(0)
@@ -168,9 +374,7 @@ class BilibiliSubtitleDownloader:
         Returns:
             分P编号（从1开始），如果没有p参数返回None
         """
-        # 匹配p参数：?p=2 或 &p=2
-        pattern = r'[?&]p=(\d+)'
-        match = re.search(pattern, url)
+        match = _PAGE_RE.search(url)
         
         if match:
             return int(match.group(1))
@@ -186,14 +390,7 @@ class BilibiliSubtitleDownloader:
         Returns:
             收藏夹ID，如果提取失败返回None
         """
-        # 匹配收藏夹ID的正则表达式
-        # 格式: https://space.bilibili.com/UID/favlist?fid=FAVID
-        pattern = r'fid=(\d+)'
-        match = re.search(pattern, url)
-        
-        if match:
-            return match.group(1)
-        return None
+        return extract_fid(url)
     
     def is_favorite_url(self, url: str) -> bool:
         """
@@ -205,13 +402,15 @@ class BilibiliSubtitleDownloader:
         Returns:
             是否为收藏夹URL
         """
-        # 更严格的判断：必须包含 favlist 且有 fid= 参数
-        return 'favlist' in url and 'fid=' in url
+        return is_favorite_url(url)
     
     def get_favorite_videos(self, fid: str, max_count: Optional[int] = None) -> List[Dict]:
         """
         获取收藏夹内的视频列表
         
+        先请求第一页得到收藏夹视频总数，其余各页并行请求（仍经过 _wait_if_needed 错开发出）；
+        响应中没有总数时退回逐页请求，直到 has_more 为假。
+        
         Args:
             fid: 收藏夹ID
             max_count: 最大获取数量，None表示获取全部
@@ -219,91 +418,135 @@ class BilibiliSubtitleDownloader:
         Returns:
             视频信息列表
         """
-        videos = []
         page_size = 20
-        page_num = 1
         
         if self.debug:
             print(f"[DEBUG] 开始获取收藏夹 {fid} 的视频列表")
         
-        while True:
-            try:
-                self._wait_if_needed()
-                
-                # B站收藏夹API
-                api_url = f'https://api.bilibili.com/x/v3/fav/resource/list?media_id={fid}&ps={page_size}&pn={page_num}'
-                
-                if self.debug:
-                    print(f"[DEBUG] 请求收藏夹API (第{page_num}页): {api_url}")
-                
-                response = requests.get(api_url, headers=self.headers, cookies=self.cookies, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get('code') != 0:
-                    print(f"获取收藏夹信息失败: {data.get('message')}")
-                    break
-                
-                result_data = data.get('data', {})
-                medias = result_data.get('medias', [])
-                
-                if not medias:
-                    break
-                
-                for media in medias:
-                    video_info = {
-                        'bvid': media.get('bvid'),
-                        'title': media.get('title'),
-                        'intro': media.get('intro'),
-                        'cover': media.get('cover'),
-                        'upper': media.get('upper', {}).get('name'),
-                        'duration': media.get('duration')
-                    }
-                    videos.append(video_info)
-                    
-                    if self.debug:
-                        print(f"[DEBUG] 找到视频: {video_info['title']} ({video_info['bvid']})")
-                    
-                    # 如果达到最大数量限制，停止获取
-                    if max_count and len(videos) >= max_count:
-                        break
-                
-                # 检查是否还有更多页
-                has_more = result_data.get('has_more', False)
-                if not has_more or (max_count and len(videos) >= max_count):
-                    break
-                
-                page_num += 1
-                
-            except Exception as e:
-                print(f"获取收藏夹视频列表时出错: {e}")
-                if self.debug:
-                    import traceback
-                    traceback.print_exc()
-                break
+        videos = []
+        first_page = self._fetch_favorite_page(fid, 1, page_size)
+        if first_page is not None:
+            videos.extend(self._parse_favorite_medias(first_page))
+            media_count = (first_page.get('info') or {}).get('media_count')
+            
+            if first_page.get('has_more') and not (max_count and len(videos) >= max_count):
+                if media_count:
+                    # 已知总数，只请求需要的页
+                    wanted = min(media_count, max_count) if max_count else media_count
+                    last_page = (wanted + page_size - 1) // page_size
+                    page_nums = range(2, last_page + 1)
+                    with ThreadPoolExecutor(max_workers=max(1, min(FAVORITE_FETCH_WORKERS, len(page_nums))),
+                                            thread_name_prefix='FavoritePage') as pool:
+                        pages = list(pool.map(lambda pn: self._fetch_favorite_page(fid, pn, page_size), page_nums))
+                    for page_data in pages:
+                        # 某页失败时只保留它之前的结果，与逐页请求时的行为一致
+                        if page_data is None:
+                            break
+                        videos.extend(self._parse_favorite_medias(page_data))
+                else:
+                    page_num = 2
+                    while True:
+                        page_data = self._fetch_favorite_page(fid, page_num, page_size)
+                        if page_data is None:
+                            break
+                        medias = self._parse_favorite_medias(page_data)
+                        if not medias:
+                            break
+                        videos.extend(medias)
+                        if not page_data.get('has_more') or (max_count and len(videos) >= max_count):
+                            break
+                        page_num += 1
+        
+        if max_count:
+            videos = videos[:max_count]
+        
+        if self.debug:
+            for video_info in videos:
+                print(f"[DEBUG] 找到视频: {video_info['title']} ({video_info['bvid']})")
         
         print(f"收藏夹内找到 {len(videos)} 个视频")
         return videos
     
+    def _fetch_favorite_page(self, fid: str, page_num: int, page_size: int) -> Optional[Dict]:
+        """
+        请求收藏夹的一页内容
+        
+        Args:
+            fid: 收藏夹ID
+            page_num: 页码（从1开始）
+            page_size: 每页条数
+            
+        Returns:
+            API响应的 data 字段，失败返回None
+        """
+        try:
+            self._wait_if_needed()
+            
+            # B站收藏夹API
+            api_url = f'https://api.bilibili.com/x/v3/fav/resource/list?media_id={fid}&ps={page_size}&pn={page_num}'
+            
+            if self.debug:
+                print(f"[DEBUG] 请求收藏夹API (第{page_num}页): {api_url}")
+            
+            response = self.session.get(api_url, headers=self.headers, cookies=self.cookies, timeout=10)
+            response.raise_for_status()
+            data = _json_loads(response.content)
+            
+            if data.get('code') != 0:
+                print(f"获取收藏夹信息失败: {data.get('message')}")
+                return None
+            
+            return data.get('data') or {}
+            
+        except Exception as e:
+            print(f"获取收藏夹视频列表时出错: {e}")
+            if self.debug:
+                traceback.print_exc()
+            return None
+    
+    @staticmethod
+    def _parse_favorite_medias(page_data: Dict) -> List[Dict]:
+        """从收藏夹API的一页数据中提取视频信息"""
+        return [
+            {
+                'bvid': media.get('bvid'),
+                'title': media.get('title'),
+                'intro': media.get('intro'),
+                'cover': media.get('cover'),
+                'upper': media.get('upper', {}).get('name'),
+                'duration': media.get('duration')
+            }
+            for media in page_data.get('medias') or []
+        ]
+    
     def get_video_info(self, bvid: str) -> Optional[Dict]:
         """
-        获取视频信息，包括cid（带重试机制）
+        获取视频信息，包括cid（带重试机制，成功的结果按bvid缓存 VIDEO_INFO_CACHE_TTL 秒）
         
         Args:
             bvid: 视频的BV号
             
         Returns:
-            包含视频信息的字典，失败返回None
+            包含视频信息的字典（调用方可随意修改的副本），失败返回None
         """
+        video_info = self._video_info_cache.get(bvid)
+        if video_info is None:
+            video_info = self._fetch_video_info(bvid)
+            if video_info:
+                self._video_info_cache.put(bvid, video_info)
+        return video_info
+
+    def _fetch_video_info(self, bvid: str) -> Optional[Dict]:
+        """请求视频信息API（带重试机制），失败返回None"""
         api_url = f'https://api.bilibili.com/x/web-interface/view?bvid={bvid}'
         
         for attempt in range(self.max_retries):
             try:
                 self._wait_if_needed()
                 
-                response = requests.get(api_url, headers=self.headers, cookies=self.cookies, timeout=10)
+                response = self.session.get(api_url, headers=self.headers, cookies=self.cookies, timeout=10)
                 response.raise_for_status()
-                data = response.json()
+                data = _json_loads(response.content)
                 
                 if self.debug:
                     print(f"[DEBUG] 视频信息API响应码: {data.get('code')}")
@@ -321,12 +564,12 @@ class BilibiliSubtitleDownloader:
             except requests.exceptions.Timeout:
                 print(f"请求超时 (尝试 {attempt + 1}/{self.max_retries})")
                 if attempt < self.max_retries - 1:
-                    time.sleep(2 ** attempt)
+                    time.sleep(_retry_backoff(attempt))
                 continue
             except Exception as e:
                 print(f"请求视频信息时出错: {e}")
-                if attempt < self.max_retries - 1:
-                    time.sleep(2 ** attempt)
+                if _is_retryable_error(e) and attempt < self.max_retries - 1:
+                    time.sleep(_retry_backoff(attempt))
                     continue
                 return None
         
@@ -343,8 +586,7 @@ class BilibiliSubtitleDownloader:
             part_title: 分P标题（可选）
             page_num: 分P序号（可选）
         """
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(video_info, f, ensure_ascii=False, indent=2)
+        _write_json_file(video_info, output_path)
         
         # 不再生成Excel文件
         # tittle = video_info['title']
@@ -358,7 +600,7 @@ class BilibiliSubtitleDownloader:
 
     def get_subtitle_info(self, bvid: str, cid: int) -> Optional[List[Dict]]:
         """
-        获取字幕信息（包括官方CC字幕和AI字幕，带重试机制）
+        获取字幕信息（包括官方CC字幕和AI字幕，带重试机制，找到的字幕列表按 (bvid, cid) 缓存 VIDEO_INFO_CACHE_TTL 秒）
         
         Args:
             bvid: 视频的BV号
@@ -367,6 +609,17 @@ class BilibiliSubtitleDownloader:
         Returns:
             字幕信息列表，失败返回None
         """
+        key = (bvid, cid)
+        subtitles = self._subtitle_info_cache.get(key)
+        if subtitles is None:
+            subtitles = self._fetch_subtitle_info(bvid, cid)
+            # 没找到字幕时不缓存，更换Cookie后重试可以立即生效
+            if subtitles:
+                self._subtitle_info_cache.put(key, subtitles)
+        return subtitles
+
+    def _fetch_subtitle_info(self, bvid: str, cid: int) -> Optional[List[Dict]]:
+        """请求字幕信息API（依次尝试各个API，带重试机制），失败或没有字幕时返回None"""
         # 定义要尝试的API列表
         api_attempts = []
         
@@ -396,6 +649,11 @@ class BilibiliSubtitleDownloader:
         #     'url': f'https://api.bilibili.com/x/player/v2?bvid={bvid}&cid={cid}'
         # })
         
+        # 上次成功返回字幕的API排到最前，同一批视频通常由同一个API返回，省去先试另一个的请求和等待
+        preferred = self._preferred_subtitle_api
+        if preferred:
+            api_attempts.sort(key=lambda api: api['name'] != preferred)
+        
         for api_info in api_attempts:
             name = api_info['name']
             api_url = api_info['url']
@@ -408,33 +666,20 @@ class BilibiliSubtitleDownloader:
                 try:
                     self._wait_if_needed()
                     
-                    response = requests.get(api_url, headers=self.headers, cookies=self.cookies, timeout=10)
+                    response = self.session.get(api_url, headers=self.headers, cookies=self.cookies, timeout=10)
                     response.raise_for_status()
-                    data = response.json()
+                    data = _json_loads(response.content)
                     
                     if self.debug:
                         print(f"[DEBUG] {name} 响应码: {data.get('code')}")
                     
                     if data.get('code') == 0:
-                        subtitle_data = data.get('data', {}).get('subtitle', {})
-                        subtitles = subtitle_data.get('subtitles', [])
-                        
-                        # 检查是否有AI字幕
-                        ai_subtitle = subtitle_data.get('ai_subtitle')
-                        if ai_subtitle and isinstance(ai_subtitle, dict):
-                            ai_subtitle_url = ai_subtitle.get('subtitle_url')
-                            if ai_subtitle_url:
-                                ai_sub_info = {
-                                    'lan': 'ai-zh',
-                                    'lan_doc': 'AI字幕(中文)',
-                                    'subtitle_url': ai_subtitle_url,
-                                    'is_ai': True
-                                }
-                                subtitles.append(ai_sub_info)
+                        subtitles = self._extract_subtitles(data.get('data', {}).get('subtitle', {}))
                         
                         if subtitles:
                             if self.debug:
                                 print(f"[DEBUG] {name} 获取成功，找到 {len(subtitles)} 个字幕")
+                            self._preferred_subtitle_api = name
                             return subtitles
                         else:
                             # 响应成功但无字幕，可能是真没字幕
@@ -449,8 +694,11 @@ class BilibiliSubtitleDownloader:
                         
                 except Exception as e:
                     print(f"请求出错 ({name}, 尝试 {attempt + 1}): {e}")
+                    if not _is_retryable_error(e):
+                        # 非临时性错误，直接尝试下一个API
+                        break
                     if attempt < self.max_retries - 1:
-                        time.sleep(1)
+                        time.sleep(_retry_backoff(attempt))
                     # 如果重试耗尽，循环自然结束，尝试下一个API
         
         # If we reach here, no subtitles were found after all attempts
@@ -462,6 +710,30 @@ class BilibiliSubtitleDownloader:
             
         return None
     
+    @staticmethod
+    def _extract_subtitles(subtitle_data: Dict) -> List[Dict]:
+        """
+        从播放器API的 subtitle 字段中取出字幕列表，AI字幕作为 ai-zh 语言附加在末尾
+        
+        Args:
+            subtitle_data: API响应中的 data.subtitle 字段
+            
+        Returns:
+            字幕信息列表（可能为空）
+        """
+        subtitles = subtitle_data.get('subtitles') or []
+        
+        # 检查是否有AI字幕
+        ai_subtitle = subtitle_data.get('ai_subtitle')
+        if isinstance(ai_subtitle, dict) and ai_subtitle.get('subtitle_url'):
+            subtitles.append({
+                'lan': 'ai-zh',
+                'lan_doc': 'AI字幕(中文)',
+                'subtitle_url': ai_subtitle['subtitle_url'],
+                'is_ai': True
+            })
+        return subtitles
+
     def download_subtitle(self, subtitle_url: str, is_ai: bool = False) -> Optional[List[Dict]]:
         """
         下载字幕内容（带重试机制）
@@ -487,12 +759,12 @@ class BilibiliSubtitleDownloader:
                 
                 # AI字幕需要带cookies
                 if is_ai or 'aisubtitle' in subtitle_url:
-                    response = requests.get(subtitle_url, headers=self.headers, cookies=self.cookies, timeout=15)
+                    response = self.session.get(subtitle_url, headers=self.headers, cookies=self.cookies, timeout=15)
                 else:
-                    response = requests.get(subtitle_url, headers=self.headers, timeout=15)
+                    response = self.session.get(subtitle_url, headers=self.headers, timeout=15)
                 
                 response.raise_for_status()
-                subtitle_data = response.json()
+                subtitle_data = _json_loads(response.content)
                 
                 if self.debug:
                     print(f"[DEBUG] 字幕数据类型: {subtitle_data.get('type', 'standard')}")
@@ -503,15 +775,14 @@ class BilibiliSubtitleDownloader:
             except requests.exceptions.Timeout:
                 print(f"下载字幕超时 (尝试 {attempt + 1}/{self.max_retries})")
                 if attempt < self.max_retries - 1:
-                    time.sleep(2 ** attempt)
+                    time.sleep(_retry_backoff(attempt))
                 continue
             except Exception as e:
                 print(f"下载字幕时出错: {e}")
                 if self.debug:
-                    import traceback
                     traceback.print_exc()
-                if attempt < self.max_retries - 1:
-                    time.sleep(2 ** attempt)
+                if _is_retryable_error(e) and attempt < self.max_retries - 1:
+                    time.sleep(_retry_backoff(attempt))
                     continue
                 return None
         
@@ -525,18 +796,15 @@ class BilibiliSubtitleDownloader:
             subtitle_content: 字幕内容列表
             output_path: 输出文件路径
         """
+        # 每条字幕为：序号、时间轴、字幕内容、空行；先拼成整个文件再一次写入
+        format_timestamp = self._format_timestamp
+        parts = []
+        for index, item in enumerate(subtitle_content, 1):
+            start, end, content = _cue_fields(item)
+            parts.append(f"{index}\n{format_timestamp(start)} --> {format_timestamp(end)}\n{content}\n\n")
+        
         with open(output_path, 'w', encoding='utf-8') as f:
-            for index, item in enumerate(subtitle_content, 1):
-                # SRT格式：序号
-                f.write(f"{index}\n")
-                
-                # 时间轴
-                start_time = self._format_timestamp(item['from'])
-                end_time = self._format_timestamp(item['to'])
-                f.write(f"{start_time} --> {end_time}\n")
-                
-                # 字幕内容
-                f.write(f"{item['content']}\n\n")
+            f.write(''.join(parts))
         
         print(f"字幕已保存到: {output_path}")
     
@@ -548,8 +816,7 @@ class BilibiliSubtitleDownloader:
             subtitle_content: 字幕内容列表
             output_path: 输出文件路径
         """
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(subtitle_content, f, ensure_ascii=False, indent=2)
+        _write_json_file(subtitle_content, output_path, indent=self.pretty_json)
         
         print(f"字幕已保存到: {output_path}")
     
@@ -562,8 +829,7 @@ class BilibiliSubtitleDownloader:
             output_path: 输出文件路径
         """
         with open(output_path, 'w', encoding='utf-8') as f:
-            for item in subtitle_content:
-                f.write(f"{item['content']}\n")
+            f.write(''.join(f"{item['content']}\n" for item in subtitle_content))
         
         print(f"字幕已保存到: {output_path}")
     
@@ -588,13 +854,18 @@ class BilibiliSubtitleDownloader:
             if self.debug:
                 print(f"[DEBUG] 下载封面URL: {cover_url}")
             
-            # 下载图片
-            response = requests.get(cover_url, headers=self.headers, timeout=30)
-            response.raise_for_status()
-            
-            # 保存图片
-            with open(output_path, 'wb') as f:
-                f.write(response.content)
+            # 边下载边写入文件，不在内存中缓存整张图片
+            with self.session.get(cover_url, headers=self.headers, timeout=30, stream=True) as response:
+                response.raise_for_status()
+                try:
+                    with open(output_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=65536):
+                            f.write(chunk)
+                except Exception:
+                    # 下载中断时删除写了一半的文件
+                    if os.path.exists(output_path):
+                        os.remove(output_path)
+                    raise
             
             print(f"封面已保存到: {output_path}")
             return True
@@ -602,7 +873,6 @@ class BilibiliSubtitleDownloader:
         except Exception as e:
             print(f"下载封面时出错: {e}")
             if self.debug:
-                import traceback
                 traceback.print_exc()
             return False
     
@@ -616,10 +886,11 @@ class BilibiliSubtitleDownloader:
         Returns:
             格式化的时间字符串
         """
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        millis = int((seconds - int(seconds)) * 1000)
+        # 先四舍五入到整数毫秒再逐级拆分，避免浮点截断把 1.9999 秒写成 00:00:01,999
+        millis = int(seconds * 1000 + 0.5)
+        secs, millis = divmod(millis, 1000)
+        minutes, secs = divmod(secs, 60)
+        hours, minutes = divmod(minutes, 60)
         
         return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
     
@@ -713,6 +984,29 @@ class BilibiliSubtitleDownloader:
         
         return []  # 如果没有找到任何中文字幕，返回空列表
 
+    def _fetch_subtitle_infos(self, pages: List[Dict], bvid: str) -> Dict[int, Optional[List[Dict]]]:
+        """
+        并行获取多个分P的字幕信息
+
+        各请求仍经过 _wait_if_needed 限速，但网络往返可以重叠，不再逐个等待响应。
+
+        Args:
+            pages: 分P列表
+            bvid: 默认BV号（分P没有自己的 bvid 时使用）
+
+        Returns:
+            cid 到字幕信息列表的映射
+        """
+        def fetch(page):
+            return self.get_subtitle_info(page.get('bvid') or bvid, page['cid'])
+
+        if len(pages) <= 1:
+            return {page['cid']: fetch(page) for page in pages}
+        with ThreadPoolExecutor(max_workers=min(SUBTITLE_FETCH_WORKERS, len(pages)),
+                                thread_name_prefix='SubtitleInfo') as pool:
+            infos = list(pool.map(fetch, pages))
+        return {page['cid']: info for page, info in zip(pages, infos)}
+
     def download(self, video_url: str, video_index: str = "1", output_dir: str = 'subtitles',
                  format_type: str = 'srt', language: Optional[str] = None,
                  download_cover: bool = True, custom_folder_name: Optional[str] = None,
@@ -863,14 +1157,9 @@ class BilibiliSubtitleDownloader:
             if self.debug:
                 print(f"[DEBUG] download_all_parts=True，下载所有 {len(pages)} 个分P")
         
-        # 先检查是否有可用字幕
-        has_subtitle = False
-        for page in pages:
-            cid = page['cid']
-            subtitles = self.get_subtitle_info(bvid, cid)
-            if subtitles:
-                has_subtitle = True
-                break
+        # 先并行获取所有分P的字幕信息，检查是否有可用字幕
+        subtitle_infos = self._fetch_subtitle_infos(pages, bvid)
+        has_subtitle = any(subtitle_infos.values())
         
         # 修改策略：只要 video_transcriber 模块可用，就允许使用 ASR 作为兜底
         # 原逻辑是只有当所有分P都没有字幕时才启用 ASR，这会导致部分分P有字幕而部分没有时，没有字幕的分P无法触发 ASR
@@ -882,6 +1171,8 @@ class BilibiliSubtitleDownloader:
             else:
                 print("提示: 此视频没有官方/AI字幕，且未检测到 video_transcriber 模块，无法进行本地转录")
         
+        is_multi_part = len(pages) > 1
+        
         # 遍历每个分P下载字幕
         for page in pages:
             # 优先使用剧集自己的 bvid，如果没有，则使用原始视频的 bvid
@@ -907,7 +1198,7 @@ class BilibiliSubtitleDownloader:
             if part_title:
                 page_title = part_title
             else:
-                if len(pages) > 1 or page_num > 1:
+                if is_multi_part or page_num > 1:
                     page_title = f"{title}_P{page_num}"
                 else:
                     page_title = title
@@ -919,7 +1210,7 @@ class BilibiliSubtitleDownloader:
             # 使用custom_folder_name作为基础名称（如果指定），否则使用page_title
             if custom_folder_name:
                 # 如果有自定义文件夹名称，格式为：自定义名称_P序号（多P时）或 自定义名称（单P时）
-                if len(pages) > 1 or page_num > 1:
+                if is_multi_part or page_num > 1:
                     folder_name = f"{custom_folder_name}_P{page_num}"
                 else:
                     folder_name = custom_folder_name
@@ -946,7 +1237,6 @@ class BilibiliSubtitleDownloader:
             if download_cover and cover_url:
                 print(f"\n下载视频封面...")
                 # 从URL中提取文件扩展名，如果没有则使用.jpg
-                import urllib.parse
                 parsed_url = urllib.parse.urlparse(cover_url)
                 cover_ext = os.path.splitext(parsed_url.path)[1] or '.jpg'
                 
@@ -956,14 +1246,14 @@ class BilibiliSubtitleDownloader:
                 if self.download_cover(cover_url, cover_path):
                     result['cover'] = cover_path
 
-            if len(pages) > 1:
+            if is_multi_part:
                 print(f"\n处理分P: {page_title} (cid: {cid})")
             
-            # 获取字幕信息
-            subtitles = self.get_subtitle_info(main_bvid, cid)
+            # 字幕信息已在前面统一获取
+            subtitles = subtitle_infos.get(cid)
             
             if not subtitles:
-                print(f"此视频{'分P' if len(pages) > 1 else ''}没有在线字幕")
+                print(f"此视频{'分P' if is_multi_part else ''}没有在线字幕")
                 
                 # 检查本地是否存在字幕文件
                 # 优先检查标准命名格式
@@ -974,13 +1264,23 @@ class BilibiliSubtitleDownloader:
                     f"{page_title}_zh.srt"
                 ]
                 
+                # 一次列出目录中的字幕文件，再按优先级查表，避免对每个候选名分别 stat
+                local_srt_files = {}
+                try:
+                    with os.scandir(video_dir) as it:
+                        for entry in it:
+                            if entry.name.endswith('.srt'):
+                                local_srt_files[entry.name] = entry
+                except OSError:
+                    pass
+                
                 local_subtitle_found = False
                 for filename in check_filenames:
-                    local_path = os.path.join(video_dir, filename)
-                    if os.path.exists(local_path) and os.path.getsize(local_path) > 0:
+                    entry = local_srt_files.get(filename)
+                    if entry is not None and entry.stat().st_size > 0:
                         print(f"✅ 发现本地已存在有效字幕文件: {filename}")
                         print("将在后续步骤中使用此本地文件。")
-                        result['subtitles'].append(local_path)
+                        result['subtitles'].append(entry.path)
                         local_subtitle_found = True
                         break
                 
@@ -1004,7 +1304,6 @@ class BilibiliSubtitleDownloader:
                     # 构建输出路径
                     # 使用带有分P信息的 page_title 加上随机后缀来命名，彻底避免并发冲突
                     # 临时音频文件不需要保持可读性，只要保证唯一性即可
-                    import uuid
                     random_suffix = str(uuid.uuid4())[:8]
                     audio_filename = f"{page_title}_audio_{random_suffix}.mp3"
                     audio_path = os.path.join(video_dir, audio_filename)
@@ -1027,7 +1326,6 @@ class BilibiliSubtitleDownloader:
                         sys.stdout.flush()
                         # 转录
                         # 使用subprocess调用转录脚本，以隔离可能的底层Crash（特别是Windows+CUDA环境下）
-                        import subprocess
                         # 注意：sys已经在文件头部导入，此处不要重复导入，否则会导致UnboundLocalError
                         
                         print(f"启动独立进程进行转录 (Model: small)...")
@@ -1127,28 +1425,29 @@ def load_cookies_from_file(config_file: str = 'cookies.txt') -> Dict[str, Option
         'buvid3': None
     }
     
-    config_path = Path(config_file)
-    if not config_path.exists():
-        return cookies
-    
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                # 跳过空行和注释
-                if not line or line.startswith('#'):
-                    continue
-                
-                # 解析 key=value 格式
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip().lower()
-                    value = value.strip()
-                    
-                    if key in cookies and value:
-                        cookies[key] = value
+        lines = Path(config_file).read_text(encoding='utf-8').splitlines()
+    except FileNotFoundError:
+        return cookies
     except Exception as e:
         print(f"警告: 读取配置文件失败: {e}")
+        return cookies
+    
+    for line in lines:
+        line = line.strip()
+        # 跳过空行和注释
+        if not line or line[0] == '#':
+            continue
+        
+        # 解析 key=value 格式
+        key, sep, value = line.partition('=')
+        if not sep:
+            continue
+        key = key.strip().lower()
+        value = value.strip()
+        
+        if key in cookies and value:
+            cookies[key] = value
     
     return cookies
 
@@ -1192,6 +1491,8 @@ def main():
                        help='Bilibili登录凭证 buvid3 (会覆盖配置文件中的值)')
     parser.add_argument('--debug', action='store_true',
                        help='启用调试模式，输出详细信息')
+    parser.add_argument('-p', '--pretty', action='store_true',
+                       help='JSON格式字幕带缩进输出 (默认: 紧凑格式)')
     
     args = parser.parse_args()
     
@@ -1212,13 +1513,14 @@ def main():
         else:
             print("[DEBUG] 未提供SESSDATA，可能无法下载AI字幕")
     
-    downloader = BilibiliSubtitleDownloader(
+    with BilibiliSubtitleDownloader(
         sessdata=sessdata,
         bili_jct=bili_jct,
         buvid3=buvid3,
-        debug=args.debug
-    )
-    downloader.download(args.url, args.output, args.format, args.language)
+        debug=args.debug,
+        pretty_json=args.pretty
+    ) as downloader:
+        downloader.download(args.url, args.output, args.format, args.language)
 
 
 if __name__ == '__main__':
@@ -7,6 +7,9 @@ datas = [
     ('bilibili_subtitle_downloader.py', '.'),
     ('download_and_summarize.py', '.'),
     ('llm_client.py', '.'),
+    ('llm_cache.py', '.'),
+    ('file_utils.py', '.'),
+    ('semantic_cache.py', '.'),
     ('subtitle_summarizer.py', '.'),
     ('process_video_info.py', '.'),
     ('app.py', '.'),
@@ -20,6 +23,8 @@ hiddenimports = [
     'click',
     'itsdangerous',
     'markupsafe',
+    'waitress',
+    'orjson',
     'openpyxl',
     'openpyxl.styles',
     'openpyxl.cell',
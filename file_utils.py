@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件读写工具
+结果文件、LLM缓存条目等需要原子替换的写入共用此处的实现
+"""
+
+import os
+import tempfile
+
+
+def atomic_write_bytes(filepath: str, data: bytes) -> None:
+    """
+    先写临时文件再 os.replace 替换，进程中途退出也不会留下半截文件
+
+    Args:
+        filepath: 目标文件路径
+        data: 要写入的字节
+    """
+    # 临时文件建在同一目录（os.replace 要求同一文件系统），文件名唯一，多个线程或进程同时保存同一文件时互不覆盖
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or '.',
+                                    prefix=f'.{os.path.basename(filepath)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb', buffering=1 << 20) as f:
+            f.write(data)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        # 写入失败（如磁盘已满）时不留下临时文件
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
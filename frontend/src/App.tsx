@@ -34,6 +34,7 @@ function App() {
   const [workspaceAlert, setWorkspaceAlert] = useState<AlertProps | null>(null);
   const [taskAlert, setTaskAlert] = useState<AlertProps | null>(null);
   const [pollInterval, setPollInterval] = useState<number | null>(null);
+  const [taskStream, setTaskStream] = useState<EventSource | null>(null);
   const [courseData, setCourseData] = useState<CourseData | null>(null);
   const [isPollingActive, setIsPollingActive] = useState<boolean>(false);
 
@@ -242,62 +243,109 @@ function App() {
     [loadModels]
   );
 
-  // 加载任务列表
-  const loadTasks = useCallback(async () => {
+  // 加载任务列表（首次加载，以及推送连接不可用时的轮询）
+  const loadTasks = useCallback(async (): Promise<boolean> => {
     try {
       const response = await fetch('/api/tasks');
       const data: TasksResponse = await response.json();
 
       if (data.success && data.tasks) {
-        const tasksMap: Record<string, Task> = {};
-        data.tasks.forEach((task) => {
-          tasksMap[task.id] = task;
+        const loaded = data.tasks;
+        setTasks((prev) => {
+          const tasksMap: Record<string, Task> = {};
+          loaded.forEach((task) => {
+            // 推送来的状态可能比本次响应更新，保留版本较新的一份
+            const current = prev[task.id];
+            tasksMap[task.id] = current && (current.version ?? 0) > (task.version ?? 0) ? current : task;
+          });
+          return tasksMap;
         });
-        setTasks(tasksMap);
-
-        // 检查是否还有活跃任务（非完成、失败或已停止状态的任务）
-        const activeTasks = data.tasks.filter(
-          (t) => !['completed', 'failed', 'stopped'].includes(t.status)
-        );
-
-        // 如果没有活跃任务，停止轮询
-        if (activeTasks.length === 0 && isPollingActive) {
-          console.log("停止轮询：没有活跃任务");
-          stopPolling(); // 使用新的停止轮询函数
-        }
       }
+      return true;
     } catch (error) {
       console.error('加载任务失败:', error);
-      // 如果请求失败，停止轮询以避免错误循环
-      if (isPollingActive) {
-        console.log("因错误停止轮询");
-        stopPolling(); // 使用新的停止轮询函数
-      }
+      return false;
     }
-  }, [isPollingActive]); // 更新依赖项
+  }, []);
 
-  // 新增停止轮询函数
+  // 停止接收任务状态（关闭推送连接或轮询定时器）
   const stopPolling = useCallback(() => {
+    if (taskStream) {
+      taskStream.close();
+      setTaskStream(null);
+    }
     if (pollInterval) {
       clearInterval(pollInterval);
       setPollInterval(null);
     }
     setIsPollingActive(false);
-  }, [pollInterval]);
+  }, [taskStream, pollInterval]);
 
-  // 开始轮询任务状态
-  const startPolling = useCallback(() => {
-    // 如果已经在轮询，则不重复开始
+  // 开始接收任务状态：先加载一次任务列表，之后由 /api/tasks/stream 推送每次状态变化
+  const startPolling = useCallback(async () => {
+    // 如果已经在接收，则不重复开始
     if (isPollingActive) {
       return;
     }
-
-    loadTasks(); // 立即加载一次
-    const interval = window.setInterval(loadTasks, 2000); // 使用window.setInterval明确指定使用浏览器API
-    setPollInterval(interval);
     setIsPollingActive(true);
+
+    await loadTasks(); // 立即加载一次
+
+    const source = new EventSource('/api/tasks/stream');
+    source.addEventListener('task', (event) => {
+      const task: Task = JSON.parse((event as MessageEvent).data);
+      setTasks((prev) => {
+        const current = prev[task.id];
+        if (current && (current.version ?? 0) > (task.version ?? 0)) {
+          return prev;
+        }
+        return { ...prev, [task.id]: task };
+      });
+    });
+    source.addEventListener('task_removed', (event) => {
+      const { id } = JSON.parse((event as MessageEvent).data) as { id: string };
+      setTasks((prev) => {
+        if (!(id in prev)) {
+          return prev;
+        }
+        const next = { ...prev };
+        delete next[id];
+        return next;
+      });
+    });
+    source.onerror = () => {
+      // 推送连接失败（如后端不支持 SSE 或已断开）时退回定时轮询
+      console.log("任务推送连接失败，改为轮询");
+      source.close();
+      setTaskStream(null);
+      const interval = window.setInterval(async () => {
+        if (!(await loadTasks())) {
+          // 如果请求失败，停止轮询以避免错误循环
+          console.log("因错误停止轮询");
+          clearInterval(interval);
+          setPollInterval(null);
+          setIsPollingActive(false);
+        }
+      }, 2000);
+      setPollInterval(interval);
+    };
+    setTaskStream(source);
   }, [loadTasks, isPollingActive]);
 
+  // 没有活跃任务（非完成、失败或已停止状态的任务）时停止接收
+  useEffect(() => {
+    if (!taskStream && !pollInterval) {
+      return;
+    }
+    const activeTasks = Object.values(tasks).filter(
+      (t) => !['completed', 'failed', 'stopped'].includes(t.status)
+    );
+    if (activeTasks.length === 0) {
+      console.log("停止接收任务状态：没有活跃任务");
+      stopPolling();
+    }
+  }, [tasks, taskStream, pollInterval, stopPolling]);
+
   // 处理任务提交
   const handleTaskSubmit = useCallback(
     async (taskData: CreateTaskRequest) => {
@@ -388,6 +436,15 @@ function App() {
     };
   }, [pollInterval]);
 
+  // 清理推送连接
+  useEffect(() => {
+    return () => {
+      if (taskStream) {
+        taskStream.close();
+      }
+    };
+  }, [taskStream]);
+
   // 处理课程数据保存
   const handleCourseSave = useCallback((data: CourseData) => {
     setCourseData(data);
@@ -41,6 +41,7 @@ export interface Task {
   status: TaskStatus;
   message: string;
   created_at: string;
+  version?: number;
   files?: TaskFiles;
 }
 
@@ -65,6 +66,7 @@ export interface TaskFiles {
 
 export interface TasksResponse extends ApiResponse {
   tasks: Task[];
+  removed?: string[];
 }
 
 export interface CreateTaskRequest {
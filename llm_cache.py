@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM响应缓存
+相同模型、相同输入的生成结果保存在本地，重复提交同一视频时无需再次调用LLM
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+from file_utils import atomic_write_bytes
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 写入中途退出留下的临时文件，超过此时间（秒）后由 sweep_expired 删除
+STALE_TMP_AGE = 3600
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode('utf-8'))
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+class LLMCache:
+    """基于本地文件的LLM响应缓存，每个条目一个JSON文件，支持过期时间和命中统计"""
+
+    def __init__(self, cache_dir: str = 'config/llm_cache', default_ttl: Optional[float] = 7 * 86400):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            default_ttl: 默认过期时间（秒），None 表示永不过期
+        """
+        self.cache_dir = cache_dir
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._sets = 0
+
+    @staticmethod
+    def make_key(model: str, kind: str, text: str) -> str:
+        """
+        生成缓存键
+
+        Args:
+            model: 模型标识（同一输入在不同模型下的结果不能混用）
+            kind: 生成内容类型，如 summary
+            text: 输入文本
+
+        Returns:
+            sha256 十六进制字符串
+        """
+        raw = json.dumps({'model': model, 'kind': kind, 'text': text}, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的值；不存在或已过期时返回None
+        """
+        path = self._path(key)
+        value = None
+        try:
+            with open(path, 'rb') as f:
+                entry = _loads(f.read())
+            expires_at = entry.get('expires_at')
+            if expires_at is not None and expires_at < time.time():
+                os.remove(path)
+            else:
+                value = entry.get('value')
+        except (OSError, ValueError):
+            pass
+
+        with self._lock:
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 可JSON序列化的值
+            ttl: 过期时间（秒），不传时使用默认值
+        """
+        if ttl is None:
+            ttl = self.default_ttl
+        entry = {
+            'created_at': time.time(),
+            'expires_at': time.time() + ttl if ttl is not None else None,
+            'value': value,
+        }
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再替换，避免并发读取到半截内容
+        atomic_write_bytes(path, _dumps(entry))
+
+        with self._lock:
+            self._sets += 1
+
+    def sweep_expired(self) -> int:
+        """
+        删除已过期的条目、无法解析的条目，以及写入中途退出留下的临时文件
+
+        Returns:
+            删除的文件数
+        """
+        now = time.time()
+        removed = 0
+        try:
+            subdirs = [entry.path for entry in os.scandir(self.cache_dir)
+                       if entry.is_dir() and len(entry.name) == 2]
+        except OSError:
+            return 0
+        for subdir in subdirs:
+            try:
+                entries = list(os.scandir(subdir))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.name.endswith('.tmp'):
+                        expired = now - entry.stat().st_mtime > STALE_TMP_AGE
+                    elif entry.name.endswith('.json'):
+                        try:
+                            with open(entry.path, 'rb') as f:
+                                expires_at = _loads(f.read()).get('expires_at')
+                            expired = expires_at is not None and expires_at < now
+                        except ValueError:
+                            expired = True
+                    else:
+                        continue
+                    if expired:
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取命中统计（进程启动以来）
+
+        Returns:
+            包含 hits、misses、sets、hit_rate 的字典
+        """
+        with self._lock:
+            hits, misses, sets = self._hits, self._misses, self._sets
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'sets': sets,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'cache_dir': self.cache_dir,
+        }
@@ -1,8 +1,30 @@
 import json
 import os
+import time
+import random
+import threading
 from typing import List, Dict, Any, Optional, Generator
 
 import requests
+from requests.adapters import HTTPAdapter
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 每个客户端连接池的大小，需不小于并发调用同一客户端的线程数
+HTTP_POOL_SIZE = 32
+
+# 服务端 Retry-After 要求的等待时间上限（秒）
+MAX_RETRY_AFTER = 60
+
+
+def _json_loads(content: bytes) -> Any:
+    """解析响应体（安装了 orjson 时直接解析UTF-8字节，跳过 requests 的文本解码）"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
 
 
 class OpenAICompatClient:
@@ -14,18 +36,28 @@ class OpenAICompatClient:
         default_model: str,
         request_timeout: int = 60,
         default_params: Optional[Dict[str, Any]] = None,
+        max_retries: int = 3,
+        concurrency_limit: Optional[threading.Semaphore] = None,
     ):
         self.api_base = (api_base or "").rstrip("/")
         self.api_key = api_key or ""
         self.default_model = default_model
         self.request_timeout = int(request_timeout or 60)
         self.default_params = default_params or {}
+        self.max_retries = max(0, int(max_retries))
+        # 同一 provider 的多个客户端可共用一个信号量，限制同时进行的请求数（含流式读取过程）
+        self.concurrency_limit = concurrency_limit
         if not self.api_base:
             raise RuntimeError("api_base 未配置")
         if not self.api_key:
             raise RuntimeError("api_key 未配置")
         if not self.default_model:
             raise RuntimeError("default_model 未配置")
+        # 复用 HTTP 连接（keep-alive），同一客户端的多次请求无需重复 TCP/TLS 握手
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
     def chat_completions(
         self,
@@ -49,9 +81,60 @@ class OpenAICompatClient:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
-        resp = requests.post(url, headers=headers, json=payload, timeout=self.request_timeout)
+        resp = self._post_with_retry(url, headers=headers, json=payload, timeout=self.request_timeout)
         resp.raise_for_status()
-        return resp.json()
+        return _json_loads(resp.content)
+
+    def _acquire_slot(self):
+        """占用一个并发请求名额（未设置 concurrency_limit 时不做限制）"""
+        if self.concurrency_limit is not None:
+            self.concurrency_limit.acquire()
+
+    def _release_slot(self):
+        """归还 _acquire_slot 占用的名额"""
+        if self.concurrency_limit is not None:
+            self.concurrency_limit.release()
+
+    def _post_with_retry(self, url: str, keep_slot: bool = False, **kwargs) -> requests.Response:
+        """
+        发送POST请求，遇到限流（429）、服务端错误（5xx）或网络异常时按指数退避重试
+
+        并发名额只在每次发送请求期间占用，退避等待前归还，限流中的请求不会挡住其他请求。
+
+        Args:
+            url: 请求地址
+            keep_slot: 返回响应时是否继续占用名额（流式响应需在读完后由调用方 _release_slot）
+            **kwargs: 透传给 Session.post 的参数
+
+        Returns:
+            最后一次请求的响应（重试用尽时可能仍是错误响应，由调用方 raise_for_status）
+        """
+        for attempt in range(self.max_retries + 1):
+            is_last = attempt == self.max_retries
+            self._acquire_slot()
+            try:
+                resp = self.session.post(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._release_slot()
+                if is_last:
+                    raise
+                delay = None
+            except BaseException:
+                self._release_slot()
+                raise
+            else:
+                if is_last or (resp.status_code != 429 and resp.status_code < 500):
+                    if not keep_slot:
+                        self._release_slot()
+                    return resp
+                resp.close()
+                self._release_slot()
+                retry_after = resp.headers.get("Retry-After", "")
+                delay = min(float(retry_after), MAX_RETRY_AFTER) if retry_after.isdigit() else None
+            if delay is None:
+                delay = 2 ** attempt + random.uniform(0, 1)
+            print(f"LLM请求失败，{delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})")
+            time.sleep(delay)
 
     def chat_completions_stream(
         self,
@@ -75,31 +158,37 @@ class OpenAICompatClient:
             "Content-Type": "application/json",
         }
         
-        with requests.post(url, headers=headers, json=payload, timeout=self.request_timeout, stream=True) as resp:
-            resp.raise_for_status()
-            resp.encoding = 'utf-8'  # 确保正确的编码
+        # 流式响应读完之前一直占用并发名额
+        resp = self._post_with_retry(url, keep_slot=True, headers=headers, json=payload,
+                                     timeout=self.request_timeout, stream=True)
+        try:
+            with resp:
+                resp.raise_for_status()
             
-            for line in resp.iter_lines(decode_unicode=True):
-                if not line or not line.strip():
-                    continue
+                # 按字节逐行处理，JSON 直接从UTF-8字节解析，不先解码成文本
+                for line in resp.iter_lines():
+                    if not line or not line.strip():
+                        continue
                     
-                # 处理 SSE 格式
-                if line.startswith('data: '):
-                    data_str = line[6:]  # 移除 'data: ' 前缀
+                    # 处理 SSE 格式
+                    if line.startswith(b'data: '):
+                        data_str = line[6:]  # 移除 'data: ' 前缀
                     
-                    # 检查是否是结束标记
-                    if data_str.strip() == '[DONE]':
-                        break
+                        # 检查是否是结束标记
+                        if data_str.strip() == b'[DONE]':
+                            break
                     
-                    try:
-                        data = json.loads(data_str)
-                        choices = data.get('choices', [])
-                        if choices:
-                            delta = choices[0].get('delta', {})
-                            content = delta.get('content', '')
-                            if content:
-                                yield content
-                    except json.JSONDecodeError:
-                        # 忽略无法解析的行
-                        continue
+                        try:
+                            data = _json_loads(data_str)
+                            choices = data.get('choices', [])
+                            if choices:
+                                delta = choices[0].get('delta', {})
+                                content = delta.get('content', '')
+                                if content:
+                                    yield content
+                        except json.JSONDecodeError:
+                            # 忽略无法解析的行
+                            continue
+        finally:
+            self._release_slot()
 
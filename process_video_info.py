@@ -9,13 +9,16 @@ import threading
 # 确保这个锁在文件顶层被定义，它就是唯一的、共享的实例
 excel_file_lock = threading.Lock()
 
+# Windows 文件名中的非法字符（另将空格一并替换）
+_ILLEGAL_FILENAME_RE = re.compile(r'[\\/:*?"<>| ]')
+
 def sanitize_filename(filename):
     """
     移除或替换 Windows 文件名中的非法字符。
     非法字符包括: \ / : * ? " < > |
     """
     # 将所有非法字符替换为下划线 '_'
-    return re.sub(r'[\\/:*?"<>| ]', '_', filename)
+    return _ILLEGAL_FILENAME_RE.sub('_', filename)
 
 def process_video_to_excel_flash(json_file_path, template_excel_path, video_index, part_title=None, page_num=None):
     """
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相似输入缓存
+精确缓存未命中时，查找此前处理过的、内容几乎相同的输入（如重新下载后略有改动的字幕），
+复用其在 LLMCache 中的结果。文本向量为字符三元组的特征哈希，不依赖额外的模型或库。
+"""
+
+import os
+import json
+import math
+import zlib
+import atexit
+import threading
+from typing import Dict, List, Optional
+from file_utils import atomic_write_bytes
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 特征哈希的桶数（向量稀疏保存，只记录非零的桶）
+VECTOR_DIM = 4096
+# add 之后延迟写盘的秒数，期间的其他 add 合并为一次写入
+SAVE_DELAY = 5.0
+
+
+class SemanticCache:
+    """按 (模型, 生成类型) 分组保存文本向量及对应的 LLMCache 键，查找余弦相似度最高的条目"""
+
+    def __init__(self, index_file: str = 'config/llm_cache/semantic_index.json',
+                 threshold: float = 0.95, max_entries: int = 500):
+        """
+        初始化缓存
+
+        Args:
+            index_file: 索引文件路径
+            threshold: 判定为相同内容的最低余弦相似度
+            max_entries: 最多保留的条目数，超出时丢弃最早的条目
+        """
+        self.index_file = index_file
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # 条目列表只整体替换、不原地修改，查找时取出引用后即可在锁外遍历
+        self._entries = None
+        self._dirty = False
+        self._save_timer = None
+        atexit.register(self.flush)
+
+    @staticmethod
+    def embed(text: str) -> Dict[int, int]:
+        """
+        计算文本向量（字符三元组哈希到 VECTOR_DIM 个桶后的计数）
+
+        Args:
+            text: 输入文本
+
+        Returns:
+            桶序号到计数的稀疏向量；文本过短时返回空字典
+        """
+        counts = {}
+        for i in range(len(text) - 2):
+            bucket = zlib.crc32(text[i:i + 3].encode('utf-8')) % VECTOR_DIM
+            counts[bucket] = counts.get(bucket, 0) + 1
+        return counts
+
+    @staticmethod
+    def _norm(counts: Dict[int, int]) -> float:
+        return math.sqrt(sum(c * c for c in counts.values()))
+
+    def preload(self) -> int:
+        """
+        预先读取索引文件（服务启动时在后台调用，首个任务无需等待读取）
+
+        Returns:
+            索引中的条目数
+        """
+        return len(self._snapshot())
+
+    def _snapshot(self) -> List[Dict]:
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read_index()
+            return self._entries
+
+    def _read_index(self) -> List[Dict]:
+        try:
+            with open(self.index_file, 'rb') as f:
+                data = f.read()
+            stored = orjson.loads(data) if orjson is not None else json.loads(data.decode('utf-8'))
+        except (OSError, ValueError):
+            return []
+        entries = []
+        for item in stored:
+            # 跳过旧格式（稠密向量）的条目
+            if 'idx' not in item:
+                continue
+            item['counts'] = dict(zip(item.pop('idx'), item.pop('cnt')))
+            entries.append(item)
+        return entries
+
+    def find(self, model: str, kind: str, text: str, threshold: Optional[float] = None) -> Optional[str]:
+        """
+        查找内容相似的已缓存输入
+
+        Args:
+            model: 模型标识
+            kind: 生成内容类型
+            text: 输入文本
+            threshold: 本次查找使用的相似度阈值，不传时使用默认值
+
+        Returns:
+            最相似条目的 LLMCache 键；没有达到阈值的条目时返回None
+        """
+        counts = self.embed(text)
+        norm = self._norm(counts)
+        if not norm:
+            return None
+        best_key, best_score = None, self.threshold if threshold is None else threshold
+        for entry in self._snapshot():
+            if entry['model'] != model or entry['kind'] != kind:
+                continue
+            # 长度相差超过10%的不可能是同一内容
+            if abs(entry['length'] - len(text)) > 0.1 * max(entry['length'], len(text)):
+                continue
+            other = entry['counts']
+            small, large = (counts, other) if len(counts) <= len(other) else (other, counts)
+            dot = sum(c * large.get(bucket, 0) for bucket, c in small.items())
+            score = dot / (norm * entry['norm'])
+            if score >= best_score:
+                best_key, best_score = entry['key'], score
+        return best_key
+
+    def add(self, model: str, kind: str, text: str, key: str) -> None:
+        """
+        记录输入文本及其结果所在的 LLMCache 键（延迟 SAVE_DELAY 秒后批量写盘）
+
+        Args:
+            model: 模型标识
+            kind: 生成内容类型
+            text: 输入文本
+            key: 结果在 LLMCache 中的键
+        """
+        counts = self.embed(text)
+        norm = self._norm(counts)
+        if not norm:
+            return
+        entry = {'model': model, 'kind': kind, 'length': len(text), 'key': key, 'counts': counts, 'norm': norm}
+        self._snapshot()
+        with self._lock:
+            entries = [e for e in self._entries if e['key'] != key]
+            entries.append(entry)
+            self._entries = entries[-self.max_entries:]
+            self._dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(SAVE_DELAY, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self) -> None:
+        """把尚未写盘的改动写入索引文件"""
+        with self._save_lock:
+            with self._lock:
+                self._save_timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                entries = self._entries
+            stored = [
+                {'model': e['model'], 'kind': e['kind'], 'length': e['length'], 'key': e['key'],
+                 'norm': e['norm'], 'idx': list(e['counts']), 'cnt': list(e['counts'].values())}
+                for e in entries
+            ]
+            if orjson is not None:
+                data = orjson.dumps(stored)
+            else:
+                data = json.dumps(stored, separators=(',', ':')).encode('utf-8')
+            try:
+                os.makedirs(os.path.dirname(self.index_file) or '.', exist_ok=True)
+                atomic_write_bytes(self.index_file, data)
+            except OSError as e:
+                print(f"警告: 保存相似缓存索引失败: {e}")
+                with self._lock:
+                    self._dirty = True
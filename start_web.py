@@ -127,9 +127,9 @@ def main():
     print("=" * 80)
     print()
     
-    # 导入并运行Flask应用
-    from app import app
-    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
+    # 导入并运行Web服务
+    from app import run_server, is_debug_enabled
+    run_server(port, debug=is_debug_enabled())
 
 
 if __name__ == '__main__':
@@ -5,16 +5,27 @@
 读取SRT字幕文件，调用大模型生成时间节点要点总结
 """
 
+import io
 import json
 import os
 import re
 import argparse
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Callable, Optional
 from pathlib import Path
 
 from llm_client import OpenAICompatClient
 
 
+# SRT 解析用的正则，模块加载时编译一次
+_SRT_BLOCK_SEP_RE = re.compile(r'\n\s*\n')
+_SRT_TIME_RE = re.compile(r'(\d{2}:\d{2}:\d{2},\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2},\d{3})')
+_AI_SUBTITLE_MARK = '<该字幕由算法自动生成>'
+_AI_SUBTITLE_MARK_RE = re.compile(re.escape(_AI_SUBTITLE_MARK) + r'\s*')
+
+# 字幕文本超过该长度（字符数）时分段总结再合并，避免单次请求上下文过长
+LONG_SUBTITLE_CHARS = 30000
+
+
 class SRTParser:
     """SRT字幕文件解析器"""
     
@@ -29,8 +40,19 @@ class SRTParser:
         Returns:
             合并后的纯文本
         """
-        subtitles = SRTParser.parse_srt_file(file_path)
+        return SRTParser.subtitles_to_plain_text(SRTParser.parse_srt_file(file_path))
+    
+    @staticmethod
+    def subtitles_to_plain_text(subtitles: List[Dict[str, str]]) -> str:
+        """
+        把已解析的字幕列表转换为纯文本（去除算法生成标记和重复句，智能添加标点）
         
+        Args:
+            subtitles: parse_srt_file 返回的字幕列表
+            
+        Returns:
+            合并后的纯文本
+        """
         # 提取所有文本内容
         texts = []
         prev_text = ""
@@ -39,7 +61,8 @@ class SRTParser:
             text = sub['content'].strip()
             
             # 去除算法生成标记
-            text = re.sub(r'<该字幕由算法自动生成>\s*', '', text)
+            if _AI_SUBTITLE_MARK in text:
+                text = _AI_SUBTITLE_MARK_RE.sub('', text)
             
             # 跳过空文本
             if not text:
@@ -147,7 +170,7 @@ class SRTParser:
             content = f.read()
         
         # 按空行分割字幕块
-        blocks = re.split(r'\n\s*\n', content.strip())
+        blocks = _SRT_BLOCK_SEP_RE.split(content.strip())
         
         for block in blocks:
             lines = block.strip().split('\n')
@@ -159,7 +182,8 @@ class SRTParser:
             
             # 第二行是时间轴
             time_line = lines[1].strip()
-            time_match = re.match(r'(\d{2}:\d{2}:\d{2},\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2},\d{3})', time_line)
+            # 先做子串检查，不含箭头的行无需进入正则
+            time_match = _SRT_TIME_RE.match(time_line) if '-->' in time_line else None
             if not time_match:
                 continue
             
@@ -178,6 +202,23 @@ class SRTParser:
         
         return subtitles
     
+    @staticmethod
+    def parse_for_llm(file_path: str) -> Tuple[str, str]:
+        """
+        只解析一次SRT文件，同时生成带时间标签的字幕文本和纯文本
+        
+        两者都由同一份 parse_srt_file 结果得到，与分别调用
+        format_subtitles_for_llm(parse_srt_file(...)) 和 extract_plain_text(...) 的结果一致
+        
+        Args:
+            file_path: SRT文件路径
+            
+        Returns:
+            (字幕文本, 纯文本)
+        """
+        subtitles = SRTParser.parse_srt_file(file_path)
+        return SRTParser.format_subtitles_for_llm(subtitles), SRTParser.subtitles_to_plain_text(subtitles)
+    
     @staticmethod
     def format_subtitles_for_llm(subtitles: List[Dict[str, str]]) -> str:
         """
@@ -194,6 +235,32 @@ class SRTParser:
             formatted_lines.append(f"[{sub['time_start']}] {sub['content']}")
         
         return '\n'.join(formatted_lines)
+    
+    @staticmethod
+    def split_for_llm(subtitle_text: str, max_chars: int = LONG_SUBTITLE_CHARS) -> List[str]:
+        """
+        按字幕行把格式化后的字幕文本切分为若干段，每段不超过 max_chars 个字符
+        
+        Args:
+            subtitle_text: format_subtitles_for_llm 生成的文本
+            max_chars: 每段最大字符数（单行超长时该行单独成段）
+            
+        Returns:
+            分段文本列表
+        """
+        chunks = []
+        current = []
+        size = 0
+        for line in subtitle_text.split('\n'):
+            if current and size + len(line) + 1 > max_chars:
+                chunks.append('\n'.join(current))
+                current = []
+                size = 0
+            current.append(line)
+            size += len(line) + 1
+        if current:
+            chunks.append('\n'.join(current))
+        return chunks
 
 
 class SubtitleSummarizer:
@@ -254,13 +321,15 @@ class SubtitleSummarizer:
         
         return prompt
     
-    def summarize(self, subtitle_text: str, stream: bool = False) -> Dict:
+    def summarize(self, subtitle_text: str, stream: bool = False,
+                  on_chunk: Optional[Callable[[str], None]] = None) -> Dict:
         """
         总结字幕内容
         
         Args:
             subtitle_text: 字幕文本
             stream: 是否使用流式输出
+            on_chunk: 流式输出时接收每个片段的回调；不传时打印到控制台
             
         Returns:
             总结结果
@@ -274,18 +343,176 @@ class SubtitleSummarizer:
         
         if stream:
             print("正在生成总结（流式输出）...\n")
-            full_response = ""
+            chunks = []
             for chunk in self.llm_client.chat_completions_stream(messages):
-                print(chunk, end='', flush=True)
-                full_response += chunk
+                if on_chunk is not None:
+                    on_chunk(chunk)
+                else:
+                    print(chunk, end='', flush=True)
+                chunks.append(chunk)
             print("\n")
-            return self._parse_response(full_response)
+            return self._parse_response(''.join(chunks))
         else:
             print("正在生成总结...\n")
             response = self.llm_client.chat_completions(messages)
             content = response['choices'][0]['message']['content']
             return self._parse_response(content)
     
+    def create_batch_summary_prompt(self, subtitle_texts: List[str]) -> str:
+        """
+        创建多段字幕合并为一次请求的总结提示词
+        
+        Args:
+            subtitle_texts: 各视频（分P）的字幕文本
+            
+        Returns:
+            提示词
+        """
+        parts = '\n\n'.join(f"===视频{i}===\n{text}" for i, text in enumerate(subtitle_texts, 1))
+        
+        prompt = f"""请分别分析以下{len(subtitle_texts)}个视频的字幕内容，为每个视频提取关键要点并按时间节点总结。各视频的字幕以 "===视频N===" 分隔，彼此独立，不要混在一起总结。
+
+要求（对每个视频分别执行）：
+1. **粗粒度总结**：将视频划分为3-8个主要段落，每个段落时长约3-10分钟
+2. 每个段落提取一个大要点，涵盖该时间段的主要内容
+3. 时间节点格式简化为 "MM:SS"（如 "00:07", "04:28"），取该段落开始时间
+4. 标题要精炼概括该段落的核心主题（10-20字）
+5. 描述要详细全面（50-150字），包含该段落的所有重要信息点、细节和逻辑关系
+6. 按时间顺序排列
+7. 输出格式严格按照以下JSON格式，videos 数组按视频顺序排列，长度必须为{len(subtitle_texts)}：
+
+```json
+{{
+  "videos": [
+    {{
+      "key_points": [
+        {{
+          "time": "00:07",
+          "title": "要点标题",
+          "description": "详细描述"
+        }}
+      ]
+    }}
+  ]
+}}
+```
+
+字幕内容：
+{parts}
+
+请直接输出JSON格式的总结结果，不要包含其他说明文字。"""
+        
+        return prompt
+    
+    def summarize_batch(self, subtitle_texts: List[str]) -> Optional[List[Dict]]:
+        """
+        一次请求总结多段较短的字幕（如同一视频的多个分P），省去重复发送提示词
+        
+        Args:
+            subtitle_texts: 各视频的字幕文本
+            
+        Returns:
+            与输入顺序一致的总结结果列表；响应无法按视频拆分时返回None，由调用方逐个总结
+        """
+        messages = [
+            {"role": "system", "content": "你是一个专业的视频内容分析助手，擅长提取视频关键信息并进行结构化总结。"},
+            {"role": "user", "content": self.create_batch_summary_prompt(subtitle_texts)}
+        ]
+        print(f"正在批量生成 {len(subtitle_texts)} 个视频的总结...\n")
+        response = self.llm_client.chat_completions(messages)
+        result = self._parse_response(response['choices'][0]['message']['content'])
+        videos = result.get('videos')
+        if not isinstance(videos, list) or len(videos) != len(subtitle_texts):
+            print("警告：批量总结结果与视频数量不一致，改为逐个总结")
+            return None
+        return [{'key_points': video.get('key_points', [])} if isinstance(video, dict) else {'key_points': []}
+                for video in videos]
+    
+    def create_combine_prompt(self, summaries: List[Dict]) -> str:
+        """
+        创建合并分段总结的提示词
+        
+        Args:
+            summaries: 按时间顺序排列的各段总结结果
+            
+        Returns:
+            提示词
+        """
+        lines = []
+        for summary in summaries:
+            for point in summary.get('key_points', []):
+                lines.append(f"[{point.get('time', '')}] {point.get('title', '')}：{point.get('description', '')}")
+        points_text = '\n'.join(lines)
+        
+        prompt = f"""以下是一个长视频按时间顺序分段总结得到的要点，请把它们合并为整个视频的要点总结。
+
+要求：
+1. 将视频划分为3-8个主要段落，相邻且主题相近的要点合并为一个段落
+2. 时间节点格式为 "MM:SS"，取该段落第一个要点的时间
+3. 标题要精炼概括该段落的核心主题（10-20字）
+4. 描述要详细全面（50-150字），保留原要点中的重要信息
+5. 按时间顺序排列
+6. **不要**输出 video_summary 字段
+7. 输出格式严格按照以下JSON格式：
+
+```json
+{{
+  "key_points": [
+    {{
+      "time": "00:07",
+      "title": "要点标题",
+      "description": "详细描述"
+    }}
+  ]
+}}
+```
+
+分段要点：
+{points_text}
+
+请直接输出JSON格式的总结结果，不要包含其他说明文字。"""
+        
+        return prompt
+    
+    def combine_summaries(self, summaries: List[Dict], stream: bool = False,
+                          on_chunk: Optional[Callable[[str], None]] = None) -> Dict:
+        """
+        把长视频各段的总结合并为整体总结
+        
+        Args:
+            summaries: 按时间顺序排列的各段总结结果（summarize 的返回值）
+            stream: 是否使用流式输出
+            on_chunk: 流式输出时接收每个片段的回调；不传时打印到控制台
+            
+        Returns:
+            总结结果；所有分段都没有要点时返回空的 key_points
+        """
+        summaries = [s for s in summaries if s.get('key_points')]
+        if not summaries:
+            return {'key_points': []}
+        
+        messages = [
+            {"role": "system", "content": "你是一个专业的视频内容分析助手，擅长提取视频关键信息并进行结构化总结。"},
+            {"role": "user", "content": self.create_combine_prompt(summaries)}
+        ]
+        
+        if stream:
+            print("正在合并分段总结（流式输出）...\n")
+            chunks = []
+            for chunk in self.llm_client.chat_completions_stream(messages):
+                if on_chunk is not None:
+                    on_chunk(chunk)
+                else:
+                    print(chunk, end='', flush=True)
+                chunks.append(chunk)
+            print("\n")
+            return self._parse_response(''.join(chunks))
+        else:
+            print("正在合并分段总结...\n")
+            response = self.llm_client.chat_completions(messages)
+            content = response['choices'][0]['message']['content']
+            return self._parse_response(content)
+    
     def _parse_response(self, response_text: str) -> Dict:
         """
         解析LLM响应
@@ -387,9 +614,10 @@ class SubtitleSummarizer:
         Returns:
             提示词
         """
+        # 固定的说明文字放在最前面、视频相关内容放在最后，同一类请求共享相同前缀，可命中服务端的提示词缓存
         title_part = f"视频标题：{video_title}\n\n" if video_title else ""
         
-        prompt = f"""{title_part}请根据以下视频内容，编写一份**详细、专业的教学文档**（Markdown格式）。这份文档将作为学习资料，要求内容完整、易于理解、适合自学。
+        prompt = f"""请根据以下视频内容，编写一份**详细、专业的教学文档**（Markdown格式）。这份文档将作为学习资料，要求内容完整、易于理解、适合自学。
 
 ## 核心目标
 将视频内容转化为**结构化的教学材料**，让读者无需观看视频即可完整掌握所有知识点。
@@ -490,7 +718,7 @@ class SubtitleSummarizer:
 
 **视频原文（已预处理）：**
 
-{subtitle_text}
+{title_part}{subtitle_text}
 
 ---
 
@@ -505,7 +733,8 @@ class SubtitleSummarizer:
         
         return prompt
     
-    def generate_full_content(self, subtitle_text: str, video_title: str = "", stream: bool = False) -> str:
+    def generate_full_content(self, subtitle_text: str, video_title: str = "", stream: bool = False,
+                              on_chunk: Optional[Callable[[str], None]] = None) -> str:
         """
         生成完整内容文档
         
@@ -513,6 +742,7 @@ class SubtitleSummarizer:
             subtitle_text: 字幕文本
             video_title: 视频标题
             stream: 是否使用流式输出
+            on_chunk: 流式输出时接收每个片段的回调；不传时打印到控制台
             
         Returns:
             Markdown格式的完整内容
@@ -526,12 +756,15 @@ class SubtitleSummarizer:
         
         if stream:
             print("正在生成完整内容（流式输出）...\n")
-            full_response = ""
+            chunks = []
             for chunk in self.llm_client.chat_completions_stream(messages):
-                print(chunk, end='', flush=True)
-                full_response += chunk
+                if on_chunk is not None:
+                    on_chunk(chunk)
+                else:
+                    print(chunk, end='', flush=True)
+                chunks.append(chunk)
             print("\n")
-            return self._clean_markdown_response(full_response)
+            return self._clean_markdown_response(''.join(chunks))
         else:
             print("正在生成完整内容...\n")
             response = self.llm_client.chat_completions(messages)
@@ -549,9 +782,10 @@ class SubtitleSummarizer:
         Returns:
             提示词
         """
+        # 固定的说明文字放在最前面、视频相关内容放在最后，同一类请求共享相同前缀，可命中服务端的提示词缓存
         title_part = f"视频标题：{video_title}\n\n" if video_title else ""
         
-        prompt = f"""{title_part}请根据以下视频学习内容，设计一套练习题，用于帮助学习者检验和巩固所学知识。
+        prompt = f"""请根据以下视频学习内容，设计一套练习题，用于帮助学习者检验和巩固所学知识。
 
 ## 题目要求
 ### 📝 选择题（9道）
@@ -660,7 +894,7 @@ class SubtitleSummarizer:
 
 **学习内容：**
 
-{subtitle_text}
+{title_part}{subtitle_text}
 
 ---
 
@@ -841,9 +1075,10 @@ class SubtitleSummarizer:
         Returns:
             提示词
         """
+        # 固定的说明文字放在最前面、视频相关内容放在最后，同一类请求共享相同前缀，可命中服务端的提示词缓存
         title_part = f"视频标题：{video_title}\n\n" if video_title else ""
         
-        prompt = f"""{title_part}请根据以下视频内容，设计3个预设问题，用于引导观众思考视频的核心内容。
+        prompt = f"""请根据以下视频内容，设计3个预设问题，用于引导观众思考视频的核心内容。
 
 ## 问题要求
 
@@ -902,7 +1137,7 @@ class SubtitleSummarizer:
 
 **视频内容：**
 
-{subtitle_text}
+{title_part}{subtitle_text}
 
 ---
 
@@ -1080,6 +1315,52 @@ def list_available_models(config_file: str = 'config/llm_models.json') -> None:
         print(f"读取配置文件失败: {e}")
 
 
+# 控制台输出的分隔线
+SEPARATOR = "=" * 80
+# 要点描述每行的最大宽度（含3个字符的缩进）
+DESCRIPTION_WIDTH = 77
+DESCRIPTION_INDENT = "   "
+
+
+def _wrap_description(description: str) -> List[str]:
+    """
+    把要点描述按宽度断行，尽量在最近的标点符号或空格处换行
+    
+    Args:
+        description: 描述文本
+        
+    Returns:
+        带缩进的行列表
+    """
+    lines = []
+    current_line = DESCRIPTION_INDENT
+    pos = 0
+    # 每次直接补足到行宽，而不是逐字符拼接
+    while pos < len(description):
+        need = DESCRIPTION_WIDTH - len(current_line)
+        current_line += description[pos:pos + need]
+        pos += need
+        if len(current_line) < DESCRIPTION_WIDTH:
+            break
+        # 找到最近的标点符号或空格来断行
+        break_pos = max(
+            current_line.rfind('。'),
+            current_line.rfind('，'),
+            current_line.rfind('、'),
+            current_line.rfind(' ')
+        )
+        if break_pos > 3:  # 确保不是在开头
+            lines.append(current_line[:break_pos + 1])
+            current_line = DESCRIPTION_INDENT + current_line[break_pos + 1:]
+        else:
+            lines.append(current_line)
+            current_line = DESCRIPTION_INDENT
+    
+    if current_line.strip():
+        lines.append(current_line)
+    return lines
+
+
 def format_output(summary: Dict) -> str:
     """
     格式化输出结果
@@ -1090,54 +1371,28 @@ def format_output(summary: Dict) -> str:
     Returns:
         格式化的文本
     """
-    output_lines = []
-    output_lines.append("=" * 80)
-    output_lines.append("视频内容总结")
-    output_lines.append("=" * 80)
-    output_lines.append("")
+    key_points = summary.get('key_points', [])
+    buf = io.StringIO()
+    w = buf.write
+    w(f"{SEPARATOR}\n视频内容总结\n{SEPARATOR}\n\n")
     
     # 关键要点
-    key_points = summary.get('key_points', [])
-    output_lines.append(f"🎯 关键要点（共 {len(key_points)} 个）：")
-    output_lines.append("")
+    w(f"🎯 关键要点（共 {len(key_points)} 个）：\n\n")
     
     for i, point in enumerate(key_points, 1):
         time = point.get('time', '未知')
         title = point.get('title', '无标题')
         description = point.get('description', '无描述')
         
-        output_lines.append(f"{i}. [{time}] {title}")
-        output_lines.append("")
-        # 描述可能很长，按句子或标点符号分段显示
-        # 每行最多80字符，自动换行
-        desc_lines = []
-        current_line = "   "
-        for char in description:
-            current_line += char
-            if len(current_line) >= 77:  # 留3个字符的缩进
-                # 找到最近的标点符号或空格来断行
-                break_pos = max(
-                    current_line.rfind('。'),
-                    current_line.rfind('，'),
-                    current_line.rfind('、'),
-                    current_line.rfind(' ')
-                )
-                if break_pos > 3:  # 确保不是在开头
-                    desc_lines.append(current_line[:break_pos + 1])
-                    current_line = "   " + current_line[break_pos + 1:]
-                else:
-                    desc_lines.append(current_line)
-                    current_line = "   "
-        
-        if current_line.strip():
-            desc_lines.append(current_line)
-        
-        output_lines.extend(desc_lines)
-        output_lines.append("")
-    
-    output_lines.append("=" * 80)
+        w(f"{i}. [{time}] {title}\n\n")
+        # 描述可能很长，每行最多80字符，自动换行
+        for line in _wrap_description(description):
+            w(line)
+            w("\n")
+        w("\n")
     
-    return '\n'.join(output_lines)
+    w(SEPARATOR)
+    return buf.getvalue()
 
 
 def main():
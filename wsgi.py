@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WSGI入口：供 waitress-serve / gunicorn 等外部WSGI服务器加载
+
+任务状态和任务队列保存在进程内存中，只能以单进程方式运行（可以多线程），例如：
+    waitress-serve --threads=16 --port=7200 wsgi:application
+    gunicorn -w 1 -k gthread --threads 16 -b 0.0.0.0:7200 wsgi:application
+"""
+
+from app import app, start_worker_threads
+
+# 外部服务器不会经过 run_server()，在加载时启动任务工作线程
+start_worker_threads()
+
+application = app